@@ -0,0 +1,85 @@
+"""Typed Parquet loads into BigQuery."""
+
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+BIGQUERY_TYPES = {
+    pa.bool_(): "BOOL",
+    pa.int64(): "INT64",
+    pa.float64(): "FLOAT64",
+    pa.string(): "STRING",
+    pa.date32(): "DATE",
+    pa.timestamp("us", tz="UTC"): "TIMESTAMP",
+}
+
+
+def to_arrow(df: pd.DataFrame, types: dict[str, pa.DataType]) -> pa.Table:
+    """Convert a frame to an Arrow table with the declared column types.
+
+    Declared timestamp columns are parsed from strings, undeclared columns keep the type of their values and
+    columns without any values become strings, so nothing is left for BigQuery to guess.
+
+    Args:
+    ----
+        df (pd.DataFrame): Frame to convert
+        types (dict[str, pa.DataType]): Arrow type of each declared column, columns missing from the frame are ignored
+
+    Returns:
+    -------
+        pa.Table: Typed table
+
+    """
+    df = df.assign(
+        **{name: pd.to_datetime(df[name], utc=True) for name, type_ in types.items() if name in df and pa.types.is_timestamp(type_)},
+    )
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    schema = pa.schema(
+        [pa.field(field.name, types.get(field.name, pa.string() if pa.types.is_null(field.type) else field.type)) for field in inferred],
+    )
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def bigquery_schema(types: dict[str, pa.DataType]) -> list[bigquery.SchemaField]:
+    """Get the BigQuery schema of the declared columns.
+
+    Args:
+    ----
+        types (dict[str, pa.DataType]): Arrow type of each declared column
+
+    Returns:
+    -------
+        list[bigquery.SchemaField]: Schema fields for the declared columns
+
+    """
+    return [bigquery.SchemaField(name, BIGQUERY_TYPES[type_]) for name, type_ in types.items()]
+
+
+def write_parquet_to_bigquery(config: dict[str, str], df: pd.DataFrame, types: dict[str, pa.DataType], write_disposition: str) -> None:
+    """Load a frame into BigQuery as a typed Parquet file.
+
+    The table schema comes from the Parquet file itself rather than from autodetection.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        df (pd.DataFrame): Frame to load
+        types (dict[str, pa.DataType]): Arrow type of each declared column
+        write_disposition (str): BigQuery write disposition
+
+    """
+    table = to_arrow(df, types)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="snappy")
+    print(f"Loading {table.num_rows} rows as {buffer.tell()} bytes of Parquet")
+    buffer.seek(0)
+
+    job_config = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET, write_disposition=write_disposition)
+    job_config.parquet_options = bigquery.ParquetOptions()
+    job_config.parquet_options.enable_list_inference = True
+    client = bigquery.Client(project=config["gcp_project"])
+    destination = f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}"
+    client.load_table_from_file(buffer, destination, job_config=job_config, location=config["location"]).result()
@@ -0,0 +1,31 @@
+"""Declared pandas dtypes for pipeline frames."""
+
+import pandas as pd
+
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict[str, str]) -> pd.DataFrame:
+    """Cast the declared columns of a frame and log its memory usage before and after.
+
+    Datetime dtypes are parsed with `pd.to_datetime`, so ISO 8601 strings with a `Z` suffix are accepted.
+
+    Args:
+    ----
+        df (pd.DataFrame): Frame to cast
+        dtypes (dict[str, str]): Pandas dtype of each declared column, columns missing from the frame are ignored
+
+    Returns:
+    -------
+        pd.DataFrame: Frame with the declared dtypes
+
+    """
+    before = df.memory_usage(deep=True).sum()
+    df = df.assign(
+        **{
+            name: pd.to_datetime(df[name], utc=dtype.endswith("UTC]")) if dtype.startswith("datetime64") else df[name].astype(dtype)
+            for name, dtype in dtypes.items()
+            if name in df
+        },
+    )
+    after = df.memory_usage(deep=True).sum()
+    print(f"Frame of {len(df)} rows uses {after / 2**20:.1f} MB, down from {before / 2**20:.1f} MB")
+    return df
@@ -1,14 +1,55 @@
 """Forecast Assignments data pipeline."""
 
-import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from os import getenv
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import requests
+from bigquery_parquet import write_parquet_to_bigquery
 from data_pipeline_tools.forecast_tools import forecast_client, unwrap_forecast_response
-from data_pipeline_tools.util import write_to_bigquery
+from frame_dtypes import apply_dtypes
+from working_days import expand_working_days
 
 START_DATE = datetime(2021, 4, 1)
+WINDOW_DAYS = 180
+MAX_WORKERS = int(getenv("FORECAST_MAX_WORKERS") or 8)
+MAX_RETRIES = 5
+TOO_MANY_REQUESTS = 429
+SERVER_ERROR = 500
+# Dates and updated_at stay strings, assignments_filled compares them as such.
+ASSIGNMENTS_DTYPES = {
+    "id": "Int64",
+    "start_date": "category",
+    "end_date": "category",
+    "allocation": "Int64",
+    "notes": "category",
+    "updated_at": "category",
+    "updated_by_id": "Int64",
+    "project_id": "Int64",
+    "person_id": "Int64",
+    "repeated_assignment_set_id": "Int64",
+    "active_on_days_off": "boolean",
+}
+ASSIGNMENTS_TYPES = {
+    "id": pa.int64(),
+    "start_date": pa.string(),
+    "end_date": pa.string(),
+    "updated_at": pa.string(),
+    "allocation": pa.int64(),
+    "notes": pa.string(),
+    "updated_by_id": pa.int64(),
+    "project_id": pa.int64(),
+    "person_id": pa.int64(),
+    "placeholder_id": pa.int64(),
+    "repeated_assignment_set_id": pa.int64(),
+    "active_on_days_off": pa.bool_(),
+    "hours": pa.float64(),
+    "days": pa.float64(),
+}
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
@@ -35,6 +76,81 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
     }
 
 
+def is_retryable(error: Exception) -> bool:
+    """Decide whether a failed Forecast request may succeed if sent again.
+
+    Args:
+    ----
+        error (Exception): Error raised by the Forecast client
+
+    Returns:
+    -------
+        bool: True for rate limiting, server errors and connection failures
+
+    """
+    if isinstance(error, requests.ConnectionError | requests.Timeout):
+        return True
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code is not None and (status_code == TOO_MANY_REQUESTS or status_code >= SERVER_ERROR)
+
+
+def get_assignments(client: object, start_date: str, end_date: str, state: str | None = None) -> list[dict]:
+    """Get assignments for a date window, retrying with exponential backoff when Forecast is rate limiting or unavailable.
+
+    Other errors, such as authentication failures, are raised at once.
+
+    Args:
+    ----
+        client (object): Forecast client
+        start_date (str): Window start date
+        end_date (str): Window end date
+        state (str | None): Assignment state, defaults to active
+
+    Returns:
+    -------
+        list[dict]: Assignments
+
+    """
+    params = {"start_date": start_date, "end_date": end_date} | ({"state": state} if state else {})
+    for attempt in range(MAX_RETRIES):
+        try:
+            return unwrap_forecast_response(client.get_assignments(**params))
+        except Exception as e:
+            if attempt == MAX_RETRIES - 1 or not is_retryable(e):
+                raise
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            delay = float(headers.get("Retry-After") or 2**attempt)
+            print(f"Retrying assignments {start_date} - {end_date} ({state or 'active'}) in {delay}s: {e}")
+            time.sleep(delay)
+    return []
+
+
+def get_all_assignments(client: object) -> list[dict]:
+    """Get active and inactive assignments from START_DATE to 800 days from today.
+
+    Windows are fetched concurrently and merged in window order, active before inactive.
+
+    Args:
+    ----
+        client (object): Forecast client
+
+    Returns:
+    -------
+        list[dict]: Assignments
+
+    """
+    windows = []
+    start_date = START_DATE
+    while start_date < datetime.today() + timedelta(days=800):
+        end_date = start_date + timedelta(days=WINDOW_DAYS - 1)
+        windows += [(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"), state) for state in (None, "inactive")]
+        start_date += timedelta(days=WINDOW_DAYS)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        responses = executor.map(lambda window: get_assignments(client, *window), windows)
+        return [assignment for response in responses for assignment in response]
+
+
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Run Forecast Assignments data pipeline.
 
@@ -50,37 +166,19 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     config = load_config(project_id, service)
     client = forecast_client(project_id)
 
-    start_date = START_DATE
-
-    assignments_list = []
-    while start_date < datetime.today() + timedelta(days=800):
-        end_date = start_date + timedelta(days=179)
-        assignments_active = unwrap_forecast_response(
-            client.get_assignments(
-                start_date=start_date.strftime("%Y-%m-%d"),
-                end_date=end_date.strftime("%Y-%m-%d"),
-            ),
-        )
-        assignments_inactive = unwrap_forecast_response(
-            client.get_assignments(
-                start_date=start_date.strftime("%Y-%m-%d"),
-                end_date=end_date.strftime("%Y-%m-%d"),
-                state="inactive",
-            ),
-        )
-        start_date += timedelta(days=180)
-        assignments_list += assignments_active + assignments_inactive
+    assignments_list = get_all_assignments(client)
 
     assignments_df = pd.DataFrame(assignments_list)
     if len(assignments_list) > 0:
         forecast_assignment_data = expand_assignments_rows(assignments_df)
 
         forecast_assignment_data = forecast_assignment_data[pd.to_datetime(forecast_assignment_data["end_date"]) > START_DATE]
+        forecast_assignment_data = apply_dtypes(forecast_assignment_data, ASSIGNMENTS_DTYPES)
 
         forecast_assignment_data["hours"] = forecast_assignment_data["allocation"] / 3600
         forecast_assignment_data["days"] = forecast_assignment_data["hours"] / 8
 
-    write_to_bigquery(config, forecast_assignment_data.drop_duplicates(), "WRITE_TRUNCATE")
+    write_parquet_to_bigquery(config, forecast_assignment_data.drop_duplicates(), ASSIGNMENTS_TYPES, "WRITE_TRUNCATE")
 
 
 def expand_assignments_rows(ass_df: pd.DataFrame) -> pd.DataFrame:
@@ -100,57 +198,11 @@ def expand_assignments_rows(ass_df: pd.DataFrame) -> pd.DataFrame:
     rows_to_edit = ass_df[ass_df["start_date"] != ass_df["end_date"]]
     single_assignment_rows = ass_df[ass_df["start_date"] == ass_df["end_date"]]
 
-    edited_rows = [
-        set_dates_in_row(copy.copy(row), weekday)
-        for _, row in rows_to_edit.iterrows()
-        for weekday in get_weekdays(
-            datetime.strptime(row["start_date"], "%Y-%m-%d"),
-            datetime.strptime(row["end_date"], "%Y-%m-%d"),
-        )
-    ]
-
-    return pd.concat([single_assignment_rows, pd.DataFrame(edited_rows)])
-
-
-def get_weekdays(start_date: datetime, end_date: datetime) -> list[datetime]:
-    """Get list of weekdays between start and end dates.
-
-    Args:
-    ----
-        start_date (datetime): Start date
-        end_date (datetime): End date
+    positions, weekdays = expand_working_days(rows_to_edit["start_date"], rows_to_edit["end_date"])
+    date_strings = np.datetime_as_string(weekdays, unit="D").astype(object)
+    edited_rows = rows_to_edit.iloc[positions].assign(start_date=date_strings, end_date=date_strings)
 
-    Returns:
-    -------
-        list: List of weekday dates
-
-    """
-    start = copy.copy(start_date)
-    dates_list = []
-    while start <= end_date:
-        if start.weekday() < 5:  # noqa: PLR2004
-            dates_list.append(start)
-        start += timedelta(days=1)
-    return dates_list
-
-
-def set_dates_in_row(row: pd.Series, date: datetime) -> pd.Series:
-    """Set the start and end dates in a row to a specific date.
-
-    Args:
-    ----
-        row (pd.Series): Row to convert
-        date (datetime): Date to set
-
-    Returns:
-    -------
-        pd.Series: Updated row
-
-    """
-    date_string = datetime.strftime(date, "%Y-%m-%d")
-    row["start_date"] = date_string
-    row["end_date"] = date_string
-    return row
+    return pd.concat([single_assignment_rows, edited_rows])
 
 
 if __name__ == "__main__":
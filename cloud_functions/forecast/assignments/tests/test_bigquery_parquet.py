@@ -0,0 +1,87 @@
+"""Tests for typing Forecast assignments for a Parquet load."""
+
+import io
+
+import main
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bigquery_parquet import BIGQUERY_TYPES, bigquery_schema, to_arrow
+from frame_dtypes import apply_dtypes
+
+ASSIGNMENTS = [
+    {
+        "id": 1,
+        "start_date": "2024-01-02",
+        "end_date": "2024-01-02",
+        "allocation": 28800,
+        "notes": None,
+        "updated_at": "2024-01-01T09:30:00.000Z",
+        "updated_by_id": 7,
+        "project_id": 11,
+        "person_id": 3,
+        "placeholder_id": None,
+        "repeated_assignment_set_id": None,
+        "active_on_days_off": False,
+    },
+    {
+        "id": 2,
+        "start_date": "2024-01-03",
+        "end_date": "2024-01-03",
+        "allocation": None,
+        "notes": "Discovery",
+        "updated_at": "2024-01-01T09:30:00.000Z",
+        "updated_by_id": 7,
+        "project_id": 11,
+        "person_id": None,
+        "placeholder_id": 5,
+        "repeated_assignment_set_id": 9,
+        "active_on_days_off": None,
+    },
+]
+
+
+def get_assignments_df() -> pd.DataFrame:
+    df = apply_dtypes(pd.DataFrame(ASSIGNMENTS), main.ASSIGNMENTS_DTYPES)
+    df["hours"] = df["allocation"] / 3600
+    df["days"] = df["hours"] / 8
+    return df
+
+
+def test_declared_columns_get_their_types() -> None:
+    table = to_arrow(get_assignments_df(), main.ASSIGNMENTS_TYPES)
+
+    assert {field.name: field.type for field in table.schema} == main.ASSIGNMENTS_TYPES
+
+
+def test_missing_values_stay_null() -> None:
+    rows = to_arrow(get_assignments_df(), main.ASSIGNMENTS_TYPES).to_pylist()
+
+    assert [row["allocation"] for row in rows] == [28800, None]
+    assert [row["placeholder_id"] for row in rows] == [None, 5]
+    assert [row["active_on_days_off"] for row in rows] == [False, None]
+    assert [row["days"] for row in rows] == [1.0, None]
+    assert [row["start_date"] for row in rows] == ["2024-01-02", "2024-01-03"]
+
+
+def test_parquet_keeps_the_declared_types() -> None:
+    table = to_arrow(get_assignments_df(), main.ASSIGNMENTS_TYPES)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+
+    assert pq.read_table(buffer).schema.equals(table.schema)
+
+
+def test_undeclared_empty_columns_become_strings() -> None:
+    df = get_assignments_df().assign(state=None)
+
+    assert to_arrow(df, main.ASSIGNMENTS_TYPES).schema.field("state").type == pa.string()
+
+
+def test_bigquery_schema_covers_every_declared_column() -> None:
+    schema = {field.name: field.field_type for field in bigquery_schema(main.ASSIGNMENTS_TYPES)}
+
+    assert schema == {name: BIGQUERY_TYPES[type_] for name, type_ in main.ASSIGNMENTS_TYPES.items()}
+    assert schema["allocation"] == "INT64"
+    assert schema["active_on_days_off"] == "BOOL"
+    assert schema["start_date"] == "STRING"
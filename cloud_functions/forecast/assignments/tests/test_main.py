@@ -0,0 +1,67 @@
+"""Tests for fetching Forecast assignment windows."""
+
+import main
+import pytest
+import requests
+
+
+class FakeForecast:
+    """Forecast client that returns one assignment per window, failing each window's first requests with a status code."""
+
+    def __init__(self, failures: int = 0, status_code: int | None = None) -> None:
+        self.failures = failures
+        self.status_code = status_code
+        self.calls: dict[tuple, int] = {}
+
+    def get_assignments(self, start_date: str, end_date: str, state: str | None = None) -> list[dict]:
+        key = (start_date, end_date, state)
+        self.calls[key] = self.calls.get(key, 0) + 1
+        if self.calls[key] <= self.failures:
+            if self.status_code is None:
+                raise requests.ConnectionError("connection reset")
+            response = requests.Response()
+            response.status_code = self.status_code
+            response.headers["Retry-After"] = "0"
+            message = f"{self.status_code} error"
+            raise requests.HTTPError(message, response=response)
+        return [{"start_date": start_date, "end_date": end_date, "state": state or "active"}]
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main.time, "sleep", lambda _: None)
+    monkeypatch.setattr(main, "unwrap_forecast_response", lambda response: response)
+
+
+def test_windows_are_merged_in_order() -> None:
+    assignments = main.get_all_assignments(FakeForecast())
+
+    assert [assignment["state"] for assignment in assignments[:4]] == ["active", "inactive", "active", "inactive"]
+    assert [assignment["start_date"] for assignment in assignments[::2]] == sorted(assignment["start_date"] for assignment in assignments[::2])
+
+
+@pytest.mark.parametrize("status_code", [None, 429, 503])
+def test_transient_errors_are_retried(status_code: int | None) -> None:
+    client = FakeForecast(failures=2, status_code=status_code)
+
+    assert main.get_assignments(client, "2024-01-01", "2024-06-28") == [
+        {"start_date": "2024-01-01", "end_date": "2024-06-28", "state": "active"},
+    ]
+    assert client.calls[("2024-01-01", "2024-06-28", None)] == 3
+
+
+@pytest.mark.parametrize("status_code", [400, 401, 404])
+def test_client_errors_are_raised_at_once(status_code: int) -> None:
+    client = FakeForecast(failures=1, status_code=status_code)
+
+    with pytest.raises(requests.HTTPError):
+        main.get_assignments(client, "2024-01-01", "2024-06-28")
+    assert client.calls[("2024-01-01", "2024-06-28", None)] == 1
+
+
+def test_retries_give_up_after_max_retries() -> None:
+    client = FakeForecast(failures=main.MAX_RETRIES, status_code=503)
+
+    with pytest.raises(requests.HTTPError):
+        main.get_assignments(client, "2024-01-01", "2024-06-28")
+    assert client.calls[("2024-01-01", "2024-06-28", None)] == main.MAX_RETRIES
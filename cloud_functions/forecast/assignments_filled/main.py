@@ -1,18 +1,23 @@
 """Forecast Assignments Filled data pipeline."""
 
-import calendar
-from datetime import datetime
+from datetime import date, datetime
 from os import getenv
 
+import numpy as np
 import pandas as pd
-from data_pipeline_tools.holiday import get_uk_holidays
-from data_pipeline_tools.util import read_from_bigquery, write_to_bigquery
+from data_pipeline_tools.util import write_to_bigquery
+from google.cloud import bigquery
+from snapshot_cache import read_from_bigquery_cached
+from working_days import get_calendar, get_working_days
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 FY_START_MONTH = 4
-FRIDAY = 4
 FIRST_YEAR = 2022
 CURRENT_YEAR = datetime.now().year - (1 if datetime.now().month < FY_START_MONTH else 0)
+FILL_COLUMNS = (
+    "id, start_date, end_date, allocation, notes, updated_at, updated_by_id, project_id, person_id, "
+    "repeated_assignment_set_id, active_on_days_off, hours, days"
+)
 
 
 def load_config(project_id: str, service: str) -> dict[str, str]:
@@ -34,6 +39,7 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "location": getenv("TABLE_LOCATION"),
         "service": service,
+        "execution_mode": getenv("EXECUTION_MODE") or "pandas",
     }
 
 
@@ -52,73 +58,171 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     config = load_config(project_id, service)
     max_year = CURRENT_YEAR + 2
 
-    bank_holidays = [date.strftime("%Y-%m-%d") for year in range(FIRST_YEAR, max_year) for date in get_uk_holidays(year)["spent_date"]]
+    calendar = get_calendar(FIRST_YEAR, max_year)
 
-    date_range = sorted(set(get_weekdays_in_fy(2)) - set(bank_holidays))
+    if config["execution_mode"] == "sql":
+        fill_in_bigquery(config, np.datetime_as_string(calendar.holidays, unit="D").tolist(), max_year)
+        return
+
+    fy_end = date(max_year, FY_START_MONTH - 1, 31)
+    date_range = np.datetime_as_string(get_working_days(date(CURRENT_YEAR, FY_START_MONTH, 1), fy_end, calendar), unit="D").tolist()
 
     forecast_query = f"""
     SELECT * FROM `{config['gcp_project']}.Forecast_Raw.assignments`
     WHERE DATE(start_date) > "{FIRST_YEAR}-03-31"
     AND DATE(start_date) < "{max_year}-03-31"
     """  # noqa: S608
-    forecast_df = read_from_bigquery(project_id, forecast_query)
+    forecast_df = read_from_bigquery_cached(project_id, forecast_query)
 
     hibob_people_query = f"""
     SELECT id FROM `{config['gcp_project']}.Forecast_Raw.people`
     WHERE archived = false
     """  # noqa: S608
-    people_df = read_from_bigquery(project_id, hibob_people_query)
-
-    entries = []
-    for person_id in people_df["id"].to_list():
-        temp_df = forecast_df[forecast_df["person_id"] == person_id]
-        already_filled_dates = temp_df["start_date"].to_list()
-        blank_dates = [x for x in date_range if x not in already_filled_dates]
-
-        for index, day in enumerate(blank_dates):
-            entries.append(
-                {
-                    "id": index,
-                    "start_date": day,
-                    "end_date": day,
-                    "allocation": 14400.0,
-                    "notes": None,
-                    "updated_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                    "updated_by_id": 9999999,
-                    "project_id": 999999,
-                    "person_id": person_id,
-                    "repeated_assignment_set_id": None,
-                    "active_on_days_off": False,
-                    "hours": 8.0,
-                    "days": 1,
-                },
-            )
-
-    write_to_bigquery(config, pd.concat([forecast_df, pd.DataFrame(entries)]), "WRITE_TRUNCATE")
-
-
-def get_weekdays_in_fy(number_of_years: int = 1) -> list[str]:
-    """Get all weekdays for a given number of financial years starting from the current one.
+    people_df = read_from_bigquery_cached(project_id, hibob_people_query)
+
+    blank_entries = get_blank_entries(people_df["id"], forecast_df, date_range)
+    write_to_bigquery(config, pd.concat([forecast_df, blank_entries]), "WRITE_TRUNCATE")
+
+
+def get_blank_entries(person_ids: pd.Series, forecast_df: pd.DataFrame, date_range: list[str]) -> pd.DataFrame:
+    """Get blank assignments for every working day a person has nothing assigned.
 
     Args:
     ----
-        number_of_years (int): Number of financial years to include
+        person_ids (pd.Series): IDs of the people to fill
+        forecast_df (pd.DataFrame): Existing assignments
+        date_range (list[str]): Working days to fill
 
     Returns:
     -------
-        list[str]: List of weekdays
+        pd.DataFrame: Blank assignments, numbered per person in date order
 
     """
+    all_days = pd.DataFrame(
+        {
+            "person_id": np.repeat(person_ids.to_numpy(), len(date_range)),
+            "start_date": np.tile(np.array(date_range, dtype=object), len(person_ids)),
+        },
+    )
+    filled_days = forecast_df[["person_id", "start_date"]].drop_duplicates()
+    merged = all_days.merge(filled_days, on=["person_id", "start_date"], how="left", indicator=True)
+    blank_days = merged[merged["_merge"] == "left_only"].reset_index(drop=True)
+
+    return pd.DataFrame(
+        {
+            "id": blank_days.groupby("person_id", sort=False).cumcount(),
+            "start_date": blank_days["start_date"],
+            "end_date": blank_days["start_date"],
+            "allocation": 14400.0,
+            "notes": None,
+            "updated_at": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "updated_by_id": 9999999,
+            "project_id": 999999,
+            "person_id": blank_days["person_id"],
+            "repeated_assignment_set_id": None,
+            "active_on_days_off": False,
+            "hours": 8.0,
+            "days": 1,
+        },
+    )
+
+
+def get_fill_query(gcp_project: str) -> str:
+    """Get the query filling assignment gaps server-side.
+
+    Only uses SQL that DuckDB runs once transpiled from BigQuery by sqlglot, so the query can be tested locally.
 
-    def get_weekdays(year: int, month: int) -> list[str]:
-        return [
-            datetime(year, month, day).strftime("%Y-%m-%d")
-            for day in range(1, calendar.monthrange(year, month)[1] + 1)
-            if calendar.weekday(year, month, day) <= FRIDAY
-        ]
+    Args:
+    ----
+        gcp_project (str): Project holding the Forecast_Raw dataset
 
-    months = [datetime(CURRENT_YEAR + i // 12, i % 12 + 1, 1) for i in range(FY_START_MONTH - 1, FY_START_MONTH - 1 + number_of_years * 12)]
-    return [day for month in months for day in get_weekdays(month.year, month.month)]
+    Returns:
+    -------
+        str: Query with `slice_start`, `slice_end`, `fy_start`, `fy_end` and `bank_holidays` parameters
+
+    """
+    return f"""
+    WITH assignments AS (
+      SELECT {FILL_COLUMNS} FROM `{gcp_project}.Forecast_Raw.assignments`
+      WHERE DATE(start_date) > @slice_start
+      AND DATE(start_date) < @slice_end
+    ),
+    working_days AS (
+      SELECT FORMAT_DATE("%F", day) AS day
+      FROM UNNEST(GENERATE_DATE_ARRAY(@fy_start, @fy_end)) AS day
+      WHERE FORMAT_DATE("%u", day) NOT IN ("6", "7")
+      AND day NOT IN UNNEST(@bank_holidays)
+    ),
+    people AS (
+      SELECT id FROM `{gcp_project}.Forecast_Raw.people`
+      WHERE archived = false
+    )
+    SELECT {FILL_COLUMNS} FROM assignments
+    UNION ALL
+    SELECT
+      ROW_NUMBER() OVER (PARTITION BY p.id ORDER BY d.day) - 1,
+      d.day,
+      d.day,
+      14400.0,
+      NULL,
+      FORMAT_TIMESTAMP("%Y-%m-%dT%H:%M:%E6SZ", CURRENT_TIMESTAMP()),
+      9999999,
+      999999,
+      p.id,
+      NULL,
+      FALSE,
+      8.0,
+      1
+    FROM people p
+    CROSS JOIN working_days d
+    LEFT JOIN assignments a
+    ON a.person_id = p.id AND a.start_date = d.day
+    WHERE a.person_id IS NULL
+    """  # noqa: S608
+
+
+def get_fill_parameters(bank_holidays: list[str], max_year: int) -> list[bigquery.ScalarQueryParameter | bigquery.ArrayQueryParameter]:
+    """Get the parameters of the fill query.
+
+    Args:
+    ----
+        bank_holidays (list[str]): Bank holidays to skip, as YYYY-MM-DD strings
+        max_year (int): Year the assignments slice ends in
+
+    Returns:
+    -------
+        list[bigquery.ScalarQueryParameter | bigquery.ArrayQueryParameter]: Query parameters
+
+    """
+    return [
+        bigquery.ScalarQueryParameter("slice_start", "DATE", date(FIRST_YEAR, 3, 31)),
+        bigquery.ScalarQueryParameter("slice_end", "DATE", date(max_year, 3, 31)),
+        bigquery.ScalarQueryParameter("fy_start", "DATE", date(CURRENT_YEAR, FY_START_MONTH, 1)),
+        bigquery.ScalarQueryParameter("fy_end", "DATE", date(max_year, FY_START_MONTH - 1, 31)),
+        bigquery.ArrayQueryParameter("bank_holidays", "DATE", [date.fromisoformat(day) for day in bank_holidays]),
+    ]
+
+
+def fill_in_bigquery(config: dict[str, str], bank_holidays: list[str], max_year: int) -> None:
+    """Fill assignment gaps server-side and write the result straight to the target table.
+
+    Produces the same rows as the pandas path: the assignments slice plus one blank assignment for every
+    working day of the current and next financial year an unarchived person has nothing assigned.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        bank_holidays (list[str]): Bank holidays to skip, as YYYY-MM-DD strings
+        max_year (int): Year the assignments slice ends in
+
+    """
+    job_config = bigquery.QueryJobConfig(
+        destination=f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}",
+        write_disposition="WRITE_TRUNCATE",
+        query_parameters=get_fill_parameters(bank_holidays, max_year),
+    )
+    client = bigquery.Client(project=config["gcp_project"])
+    client.query(get_fill_query(config["gcp_project"]), job_config=job_config, location=config["location"]).result()
 
 
 if __name__ == "__main__":
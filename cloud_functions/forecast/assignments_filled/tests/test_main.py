@@ -0,0 +1,112 @@
+"""Tests for the server-side fill query, run on DuckDB against the pandas path."""
+
+from datetime import date
+
+import duckdb
+import main
+import numpy as np
+import pandas as pd
+import pytest
+import sqlglot
+from working_days import WEEKMASK, get_working_days
+
+PROJECT = "test-project"
+CURRENT_YEAR = 2024
+MAX_YEAR = 2025
+BANK_HOLIDAYS = ["2024-05-06", "2024-12-25", "2024-12-26", "2025-01-01"]
+
+
+def assignment(id_: int, person_id: int, start_date: str) -> dict:
+    return {
+        "id": id_,
+        "start_date": start_date,
+        "end_date": start_date,
+        "allocation": 28800.0,
+        "notes": "client work",
+        "updated_at": "2024-03-01T09:00:00.000000Z",
+        "updated_by_id": 1,
+        "project_id": 10,
+        "person_id": person_id,
+        "repeated_assignment_set_id": None,
+        "active_on_days_off": False,
+        "hours": 8.0,
+        "days": 1,
+    }
+
+
+ASSIGNMENTS = pd.DataFrame(
+    [
+        assignment(1, 1, "2022-03-01"),
+        assignment(2, 1, "2024-04-02"),
+        assignment(3, 1, "2024-04-02"),
+        assignment(4, 1, "2024-12-24"),
+        assignment(5, 2, "2025-03-31"),
+        assignment(6, 3, "2024-04-03"),
+    ],
+)
+PEOPLE = pd.DataFrame({"id": [1, 2, 3, 4], "archived": [False, False, False, True]})
+
+
+def normalise(df: pd.DataFrame) -> list[tuple]:
+    """Get the rows of a frame as comparable tuples, ignoring `updated_at` and numeric and null representations."""
+
+    def value(item: object) -> object:
+        if item is None or (not isinstance(item, str) and pd.isna(item)):
+            return None
+        if isinstance(item, bool | np.bool_):
+            return bool(item)
+        if isinstance(item, int | float | np.number):
+            return float(item)
+        return item
+
+    rows = df.drop(columns="updated_at").itertuples(index=False)
+    return sorted((tuple(value(item) for item in row) for row in rows), key=repr)
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch) -> duckdb.DuckDBPyConnection:
+    monkeypatch.setattr(main, "CURRENT_YEAR", CURRENT_YEAR)
+    connection = duckdb.connect()
+    connection.execute(f'ATTACH \':memory:\' AS "{PROJECT}"')
+    connection.execute(f'CREATE SCHEMA "{PROJECT}".Forecast_Raw')
+    connection.register("assignments_df", ASSIGNMENTS)
+    connection.register("people_df", PEOPLE)
+    connection.execute(f'CREATE TABLE "{PROJECT}".Forecast_Raw.assignments AS SELECT * FROM assignments_df')  # noqa: S608
+    connection.execute(f'CREATE TABLE "{PROJECT}".Forecast_Raw.people AS SELECT * FROM people_df')  # noqa: S608
+    return connection
+
+
+def run_fill_query(connection: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    query = sqlglot.transpile(main.get_fill_query(PROJECT), read="bigquery", write="duckdb")[0]
+    parameters = {
+        parameter.name: getattr(parameter, "value", None) or getattr(parameter, "values", None)
+        for parameter in main.get_fill_parameters(BANK_HOLIDAYS, MAX_YEAR)
+    }
+    return connection.execute(query, parameters).df()
+
+
+def run_pandas_path() -> pd.DataFrame:
+    calendar = np.busdaycalendar(weekmask=WEEKMASK, holidays=np.array(BANK_HOLIDAYS, dtype="datetime64[D]"))
+    date_range = np.datetime_as_string(get_working_days(date(CURRENT_YEAR, 4, 1), date(MAX_YEAR, 3, 31), calendar), unit="D").tolist()
+    start_dates = pd.to_datetime(ASSIGNMENTS["start_date"])
+    forecast_df = ASSIGNMENTS[(start_dates > f"{main.FIRST_YEAR}-03-31") & (start_dates < f"{MAX_YEAR}-03-31")]
+    people_df = PEOPLE[~PEOPLE["archived"]]
+    return pd.concat([forecast_df, main.get_blank_entries(people_df["id"], forecast_df, date_range)])
+
+
+def test_fill_query_matches_pandas_path(database: duckdb.DuckDBPyConnection) -> None:
+    filled_df = run_fill_query(database)
+
+    assert list(filled_df.columns) == list(ASSIGNMENTS.columns)
+    assert normalise(filled_df) == normalise(run_pandas_path())
+
+
+def test_fill_query_skips_weekends_bank_holidays_and_assigned_days(database: duckdb.DuckDBPyConnection) -> None:
+    blank_df = run_fill_query(database).query("project_id == 999999")
+    blank_days = pd.to_datetime(blank_df["start_date"])
+
+    assert (blank_days.dt.dayofweek < 5).all()
+    assert not blank_df["start_date"].isin(BANK_HOLIDAYS).any()
+    assert not ((blank_df["person_id"] == 1) & blank_df["start_date"].isin(["2024-04-02", "2024-12-24"])).any()
+    assert 4 not in blank_df["person_id"].to_numpy()
+    assert blank_df.query("person_id == 2")["id"].tolist() == list(range((blank_df["person_id"] == 2).sum()))
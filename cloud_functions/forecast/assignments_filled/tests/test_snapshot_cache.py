@@ -0,0 +1,89 @@
+"""Tests for reusing Parquet snapshots of BigQuery query results."""
+
+from datetime import UTC, datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import snapshot_cache
+
+QUERY = "SELECT id, name FROM `test-project.Forecast_Raw.people`"
+TABLE = SimpleNamespace(project="test-project", dataset_id="Forecast_Raw", table_id="people")
+
+
+class FakeBigQuery:
+    """BigQuery client whose dry runs reference a single table, modified at `modified`."""
+
+    def __init__(self) -> None:
+        self.modified = datetime(2024, 4, 1, tzinfo=UTC)
+
+    def query(self, query: str, job_config: object) -> SimpleNamespace:
+        assert job_config.dry_run
+        return SimpleNamespace(referenced_tables=[TABLE])
+
+    def get_table(self, table: SimpleNamespace) -> SimpleNamespace:
+        return SimpleNamespace(modified=self.modified)
+
+
+@pytest.fixture
+def bigquery_client(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> FakeBigQuery:
+    client = FakeBigQuery()
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_LOCATION", str(tmp_path))
+    monkeypatch.setattr(snapshot_cache.bigquery, "Client", lambda project: client)
+    return client
+
+
+@pytest.fixture
+def queries(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls = []
+
+    def read_from_bigquery(project_id: str, query: str) -> pd.DataFrame:
+        calls.append(query)
+        return pd.DataFrame({"id": [1, 2], "name": ["Ada", str(len(calls))]})
+
+    monkeypatch.setattr(snapshot_cache, "read_from_bigquery", read_from_bigquery)
+    return calls
+
+
+def test_miss_writes_a_snapshot(bigquery_client: FakeBigQuery, queries: list[str], tmp_path: Path) -> None:
+    df = snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+
+    assert queries == [QUERY]
+    assert [path.name for path in tmp_path.iterdir()] == [snapshot_cache.get_snapshot_name(bigquery_client, QUERY)]
+    pd.testing.assert_frame_equal(pd.read_parquet(next(tmp_path.iterdir())), df)
+
+
+def test_hit_skips_the_query(bigquery_client: FakeBigQuery, queries: list[str]) -> None:
+    first = snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+    second = snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+
+    assert queries == [QUERY]
+    pd.testing.assert_frame_equal(second, first)
+
+
+def test_changed_table_invalidates_the_snapshot(bigquery_client: FakeBigQuery, queries: list[str], tmp_path: Path) -> None:
+    snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+    bigquery_client.modified = datetime(2024, 4, 2, tzinfo=UTC)
+
+    df = snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+
+    assert queries == [QUERY, QUERY]
+    assert df["name"].tolist() == ["Ada", "2"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_changed_query_invalidates_the_snapshot(bigquery_client: FakeBigQuery, queries: list[str]) -> None:
+    snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+    snapshot_cache.read_from_bigquery_cached("test-project", f"{QUERY} WHERE id > 0")
+
+    assert queries == [QUERY, f"{QUERY} WHERE id > 0"]
+
+
+def test_unset_location_always_queries(monkeypatch: pytest.MonkeyPatch, queries: list[str]) -> None:
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_LOCATION", None)
+
+    snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+    snapshot_cache.read_from_bigquery_cached("test-project", QUERY)
+
+    assert queries == [QUERY, QUERY]
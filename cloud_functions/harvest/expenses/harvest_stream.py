@@ -0,0 +1,147 @@
+"""Stream Harvest pages into BigQuery through a staging table."""
+
+import asyncio
+from collections.abc import Iterable, Iterator
+
+import aiohttp
+import pandas as pd
+from google.cloud import bigquery
+
+MAX_RETRIES = 5
+
+
+async def get_page(session: aiohttp.ClientSession, url: str, headers: dict[str, str], page: int, key: str) -> list[dict]:
+    """Get the items of a single Harvest page, waiting out rate limiting.
+
+    Args:
+    ----
+        session (aiohttp.ClientSession): HTTP session
+        url (str): Paginated URL, ending in `page=`
+        headers (dict[str, str]): Harvest headers
+        page (int): Page number
+        key (str): Key of the items in the response
+
+    Returns:
+    -------
+        list[dict]: Items
+
+    """
+    for _ in range(MAX_RETRIES):
+        async with session.get(f"{url}{page}", headers=headers) as response:
+            if response.status == 429:  # noqa: PLR2004
+                await asyncio.sleep(int(response.headers.get("Retry-After", 15)))
+                continue
+            response.raise_for_status()
+            return (await response.json())[key]
+    message = f"Harvest kept rate limiting page {page} of {url}"
+    raise Exception(message)
+
+
+async def get_batch(url: str, headers: dict[str, str], pages: range, key: str) -> list[dict]:
+    """Get the items of a batch of Harvest pages concurrently.
+
+    Args:
+    ----
+        url (str): Paginated URL, ending in `page=`
+        headers (dict[str, str]): Harvest headers
+        pages (range): Page numbers
+        key (str): Key of the items in the response
+
+    Returns:
+    -------
+        list[dict]: Items, in page order
+
+    """
+    async with aiohttp.ClientSession() as session:
+        batch = await asyncio.gather(*(get_page(session, url, headers, page, key) for page in pages))
+    return [item for items in batch for item in items]
+
+
+def iter_batches(url: str, headers: dict[str, str], total_pages: int, key: str, batch_size: int = 10) -> Iterator[pd.DataFrame]:
+    """Stream Harvest items, `batch_size` pages at a time.
+
+    Args:
+    ----
+        url (str): Paginated URL, ending in `page=`
+        headers (dict[str, str]): Harvest headers
+        total_pages (int): Number of pages
+        key (str): Key of the items in the response
+        batch_size (int): Number of pages fetched concurrently
+
+    Yields:
+    ------
+        pd.DataFrame: Items of each batch
+
+    """
+    for first_page in range(1, total_pages + 1, batch_size):
+        pages = range(first_page, min(first_page + batch_size, total_pages + 1))
+        print(f"Getting pages {pages.start} to {pages.stop - 1} of {total_pages}")
+        yield pd.DataFrame(asyncio.run(get_batch(url, headers, pages, key)))
+
+
+def conform_batch(batch: pd.DataFrame, fields: dict[str, bigquery.SchemaField]) -> pd.DataFrame:
+    """Convert columns staged as strings to strings, other types are converted by the load itself.
+
+    Args:
+    ----
+        batch (pd.DataFrame): Flattened batch
+        fields (dict[str, bigquery.SchemaField]): Staged or declared schema field of each column
+
+    Returns:
+    -------
+        pd.DataFrame: Batch whose string columns hold strings
+
+    """
+    strings = [
+        name
+        for name in batch
+        if name in fields and fields[name].field_type == "STRING" and fields[name].mode != "REPEATED" and batch[name].dtype != object
+    ]
+    return batch.assign(**{name: batch[name].astype(str).where(batch[name].notna(), None) for name in strings})
+
+
+def stream_to_bigquery(config: dict[str, str], batches: Iterable[pd.DataFrame], schema: list[bigquery.SchemaField] | None = None) -> None:
+    """Load batches into a staging table as they arrive, then swap it into the target table.
+
+    The swap is a single query job truncating the target, so readers see either the previous load or the new one.
+    Columns that are empty in a batch are left out of its load, later batches may add columns. Columns already
+    staged are loaded with their staged type, so a column inferred differently in a later batch, such as an
+    integer column holding NaN, cannot fail the append.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        batches (Iterable[pd.DataFrame]): Flattened batches
+        schema (list[bigquery.SchemaField] | None): Declared types of some columns, the rest are taken from the first batch holding them
+
+    """
+    client = bigquery.Client(project=config["gcp_project"])
+    target = f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}"
+    staging = f"{target}_staging"
+
+    fields = {field.name: field for field in schema or []}
+    rows = 0
+    for batch in batches:
+        batch = conform_batch(batch.dropna(axis=1, how="all"), fields)  # noqa: PLW2901
+        if batch.empty:
+            continue
+        job_config = (
+            bigquery.LoadJobConfig(
+                write_disposition="WRITE_APPEND",
+                schema_update_options=["ALLOW_FIELD_ADDITION", "ALLOW_FIELD_RELAXATION"],
+            )
+            if rows
+            else bigquery.LoadJobConfig(write_disposition="WRITE_TRUNCATE")
+        )
+        job_config.schema = [fields[name] for name in batch if name in fields]
+        client.load_table_from_dataframe(batch, staging, job_config=job_config, location=config["location"]).result()
+        fields.update({field.name: field for field in client.get_table(staging).schema})
+        rows += len(batch)
+        print(f"Staged {rows} rows")
+
+    if not rows:
+        print("Nothing to load")
+        return
+    swap_config = bigquery.QueryJobConfig(destination=target, write_disposition="WRITE_TRUNCATE")
+    client.query(f"SELECT * FROM `{staging}`", job_config=swap_config, location=config["location"]).result()  # noqa: S608
+    client.delete_table(staging, not_found_ok=True)
@@ -3,6 +3,7 @@
 import asyncio
 from os import getenv
 
+import pandas as pd
 from data_pipeline_tools.asyncs import get_all_data
 from data_pipeline_tools.auth import harvest_headers
 from data_pipeline_tools.util import (
@@ -10,6 +11,7 @@ from data_pipeline_tools.util import (
     get_harvest_pages,
     write_to_bigquery,
 )
+from harvest_stream import iter_batches, stream_to_bigquery
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
@@ -35,9 +37,29 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "location": getenv("TABLE_LOCATION"),
         "service": service,
+        "load_mode": getenv("LOAD_MODE") or "batch",
     }
 
 
+def transform_expenses(expenses_df: pd.DataFrame) -> pd.DataFrame:
+    """Keep only the receipt URL and flatten expenses.
+
+    Args:
+    ----
+        expenses_df (pd.DataFrame): Expenses as returned by Harvest
+
+    Returns:
+    -------
+        pd.DataFrame: Flattened expenses
+
+    """
+    expenses_df = expenses_df.reset_index(drop=True)
+    expenses_df["receipt"] = expenses_df["receipt"].apply(
+        lambda x: x.get("url") if isinstance(x, dict) else x,
+    )
+    return find_and_flatten_columns(expenses_df)
+
+
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Run Harvest Expenses data pipeline.
 
@@ -53,13 +75,13 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     config = load_config(project_id, service)
 
     pages, _ = get_harvest_pages(config["url"], config["headers"])
-    expenses_df = asyncio.run(get_all_data(config["url"], config["headers"], pages, "expenses", batch_size=10)).reset_index(drop=True)
-
-    expenses_df["receipt"] = expenses_df["receipt"].apply(
-        lambda x: x.get("url") if isinstance(x, dict) else x,
-    )
+    if config["load_mode"] == "streaming":
+        batches = iter_batches(config["url"], config["headers"], pages, "expenses")
+        stream_to_bigquery(config, (transform_expenses(batch) for batch in batches))
+        return
+    expenses_df = asyncio.run(get_all_data(config["url"], config["headers"], pages, "expenses", batch_size=10))
 
-    write_to_bigquery(config, find_and_flatten_columns(expenses_df), "WRITE_TRUNCATE")
+    write_to_bigquery(config, transform_expenses(expenses_df), "WRITE_TRUNCATE")
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ import asyncio
 from datetime import datetime
 from os import getenv
 
+import pandas as pd
 from data_pipeline_tools.asyncs import get_all_data
 from data_pipeline_tools.auth import harvest_headers
 from data_pipeline_tools.util import (
@@ -12,6 +13,7 @@ from data_pipeline_tools.util import (
     write_to_bigquery,
 )
 from dateutil.relativedelta import relativedelta
+from harvest_stream import iter_batches, stream_to_bigquery
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
@@ -37,25 +39,22 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "location": getenv("TABLE_LOCATION"),
         "service": service,
+        "load_mode": getenv("LOAD_MODE") or "batch",
     }
 
 
-def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
-    """Run Harvest Clients data pipeline.
-
-    Arguments are not used, but required by the Cloud Function framework.
+def transform_projects(projects_df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten projects and add their completion columns.
 
     Args:
     ----
-        data (dict): Data dictionary
-        context (dict): Context dictionary
+        projects_df (pd.DataFrame): Projects as returned by Harvest
 
-    """
-    service = "Data Pipeline - Harvest Projects"
-    config = load_config(project_id, service)
+    Returns:
+    -------
+        pd.DataFrame: Flattened projects
 
-    pages, _ = get_harvest_pages(config["url"], config["headers"])
-    projects_df = asyncio.run(get_all_data(config["url"], config["headers"], pages, "projects", batch_size=10))
+    """
     projects_df = find_and_flatten_columns(projects_df)
 
     projects_df["starts_on"] = projects_df["starts_on"].apply(lambda x: datetime.strptime(x, "%Y-%m-%d").date() if x else None)
@@ -72,8 +71,31 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     )
     projects_df["completed"] = projects_df["completion_percentage"].apply(lambda x: "completed" if x == 1 else "not completed")
     projects_df["completed_months"] = projects_df.apply(lambda row: relativedelta(row["ends_on"], row["starts_on"]).months, axis=1)
+    return projects_df
+
+
+def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
+    """Run Harvest Clients data pipeline.
+
+    Arguments are not used, but required by the Cloud Function framework.
+
+    Args:
+    ----
+        data (dict): Data dictionary
+        context (dict): Context dictionary
+
+    """
+    service = "Data Pipeline - Harvest Projects"
+    config = load_config(project_id, service)
+
+    pages, _ = get_harvest_pages(config["url"], config["headers"])
+    if config["load_mode"] == "streaming":
+        batches = iter_batches(config["url"], config["headers"], pages, "projects")
+        stream_to_bigquery(config, (transform_projects(batch) for batch in batches))
+        return
+    projects_df = asyncio.run(get_all_data(config["url"], config["headers"], pages, "projects", batch_size=10))
 
-    write_to_bigquery(config, projects_df, "WRITE_TRUNCATE")
+    write_to_bigquery(config, transform_projects(projects_df), "WRITE_TRUNCATE")
 
 
 if __name__ == "__main__":
@@ -1,19 +1,28 @@
 """Harvest Timesheets data pipeline."""
 
 import asyncio
+from datetime import datetime
 from os import getenv
 
 import pandas as pd
+import pyarrow as pa
+from bigquery_parquet import bigquery_schema, write_parquet_to_bigquery
 from data_pipeline_tools.asyncs import get_all_data
 from data_pipeline_tools.auth import harvest_headers
 from data_pipeline_tools.util import (
     find_and_flatten_columns,
     get_harvest_pages,
-    write_to_bigquery,
+    read_from_bigquery,
 )
+from frame_dtypes import apply_dtypes
+from google.cloud import bigquery
+from harvest_stream import iter_batches, stream_to_bigquery
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
+# The first hourly trigger of the day reloads everything so deleted time entries drop out of the table.
+FULL_RESYNC_HOUR = int(getenv("FULL_RESYNC_HOUR") or 6)
+
 CLIENTS = [
     "TPXimpact",
     "TPX Engineering Academy",
@@ -31,6 +40,63 @@ TASKS = [
     "Growth Sponsorship",
     "Travel Time",
 ]
+TIMESHEETS_DTYPES = {
+    "id": "Int64",
+    "spent_date": "datetime64[ns]",
+    "hours": "float64",
+    "rounded_hours": "float64",
+    "billable": "boolean",
+    "budgeted": "boolean",
+    "is_locked": "boolean",
+    "is_closed": "boolean",
+    "is_billed": "boolean",
+    "is_running": "boolean",
+    "locked_reason": "category",
+    "created_at": "datetime64[ns, UTC]",
+    "updated_at": "datetime64[ns, UTC]",
+    "user_id": "Int64",
+    "user_name": "category",
+    "client_id": "Int64",
+    "client_name": "category",
+    "client_currency": "category",
+    "project_id": "Int64",
+    "project_name": "category",
+    "project_code": "category",
+    "task_id": "Int64",
+    "task_name": "category",
+    "user_assignment_id": "Int64",
+    "task_assignment_id": "Int64",
+    "invoice_id": "Int64",
+}
+TIMESHEETS_TYPES = {
+    "id": pa.int64(),
+    "spent_date": pa.date32(),
+    "hours": pa.float64(),
+    "rounded_hours": pa.float64(),
+    "utilisation": pa.float64(),
+    "billable": pa.bool_(),
+    "billable_rate": pa.float64(),
+    "cost_rate": pa.float64(),
+    "created_at": pa.timestamp("us", tz="UTC"),
+    "updated_at": pa.timestamp("us", tz="UTC"),
+    "user_id": pa.int64(),
+    "client_id": pa.int64(),
+    "project_id": pa.int64(),
+    "task_id": pa.int64(),
+    "user_assignment_id": pa.int64(),
+    "task_assignment_id": pa.int64(),
+    "invoice_id": pa.int64(),
+    "locked_reason": pa.string(),
+    "user_name": pa.string(),
+    "client_name": pa.string(),
+    "client_currency": pa.string(),
+    "project_name": pa.string(),
+    "project_code": pa.string(),
+    "task_name": pa.string(),
+}
+# Legacy type names in table schemas that CAST does not accept.
+STANDARD_TYPES = {"INTEGER": "INT64", "FLOAT": "FLOAT64", "BOOLEAN": "BOOL"}
+NESTED_TYPES = {"RECORD", "STRUCT"}
 
 
 def load_config(project_id: str, service: str) -> dict[str, str]:
@@ -54,9 +120,174 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "location": getenv("TABLE_LOCATION"),
         "service": service,
+        "sync_mode": getenv("SYNC_MODE") or "incremental",
+        "load_mode": getenv("LOAD_MODE") or "batch",
     }
 
 
+def get_high_water_mark(config: dict[str, str]) -> str | None:
+    """Get the latest `updated_at` already loaded into the timesheets table.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+
+    Returns:
+    -------
+        str | None: High-water mark in Harvest's `updated_since` format, None if the table is empty or missing
+
+    """
+    query = f"""
+    SELECT CAST(MAX(updated_at) AS STRING) AS high_water_mark
+    FROM `{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}`
+    """  # noqa: S608
+    try:
+        high_water_mark = read_from_bigquery(config["gcp_project"], query)["high_water_mark"].iloc[0]
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to read high-water mark: {e}")
+        return None
+    if pd.isna(high_water_mark):
+        return None
+    return pd.Timestamp(high_water_mark).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def is_full_sync(config: dict[str, str], high_water_mark: str | None) -> bool:
+    """Decide whether this run should reload the whole table.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        high_water_mark (str | None): Latest `updated_at` already loaded
+
+    Returns:
+    -------
+        bool: True for a full WRITE_TRUNCATE reload, False for an incremental merge
+
+    """
+    return config["sync_mode"] != "incremental" or high_water_mark is None or datetime.now().hour == FULL_RESYNC_HOUR
+
+
+def get_timesheets(url: str, headers: dict[str, str]) -> pd.DataFrame:
+    """Get time entries from Harvest.
+
+    Args:
+    ----
+        url (str): Paginated time entries URL, ending in `page=`
+        headers (dict[str, str]): Harvest headers
+
+    Returns:
+    -------
+        pd.DataFrame: Flattened time entries, empty if there are none
+
+    """
+    pages, _ = get_harvest_pages(url, headers)
+    if not pages:
+        return pd.DataFrame()
+    timesheets_df = asyncio.run(get_all_data(url, headers, pages, "time_entries", batch_size=10))
+    if timesheets_df.empty:
+        return timesheets_df
+    return transform_timesheets(timesheets_df)
+
+
+def transform_timesheets(timesheets_df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten time entries, cast them to their declared dtypes and add the utilisation column.
+
+    Args:
+    ----
+        timesheets_df (pd.DataFrame): Time entries as returned by Harvest
+
+    Returns:
+    -------
+        pd.DataFrame: Flattened time entries
+
+    """
+    timesheets_df = apply_dtypes(find_and_flatten_columns(timesheets_df), TIMESHEETS_DTYPES)
+    timesheets_df["utilisation"] = get_utilisation(timesheets_df)
+    return timesheets_df
+
+
+def get_utilisation(timesheets_df: pd.DataFrame) -> pd.Series:
+    """Get the utilised hours of each time entry.
+
+    Args:
+    ----
+        timesheets_df (pd.DataFrame): Flattened time entries with `client_name`, `task_name` and `hours` columns
+
+    Returns:
+    -------
+        pd.Series: Hours, or 0 for internal clients and non-utilised tasks
+
+    """
+    non_utilised = timesheets_df["client_name"].isin(CLIENTS) | timesheets_df["task_name"].isin(TASKS)
+    return timesheets_df["hours"].where(~non_utilised, 0)
+
+
+def get_merge_columns(client: bigquery.Client, target: str, staging: str) -> dict[str, str]:
+    """Get the staging expression for each target column the staging table can fill.
+
+    Columns the target does not have are left for the next full reload. Scalar columns staged with a different
+    type, such as a column of nulls staged as STRING, are cast to the target type. Nested or repeated columns
+    are only merged when their staged shape matches the target.
+
+    Args:
+    ----
+        client (bigquery.Client): BigQuery client
+        target (str): Target table ID
+        staging (str): Staging table ID
+
+    Returns:
+    -------
+        dict[str, str]: Staging expression by target column name
+
+    """
+    staging_fields = {field.name: field for field in client.get_table(staging).schema}
+    columns = {}
+    for field in client.get_table(target).schema:
+        source = staging_fields.get(field.name)
+        if source is None:
+            continue
+        if source.to_api_repr() == field.to_api_repr():
+            columns[field.name] = f"S.`{field.name}`"
+        elif not {field.field_type, source.field_type} & NESTED_TYPES and "REPEATED" not in {field.mode, source.mode}:
+            columns[field.name] = f"CAST(S.`{field.name}` AS {STANDARD_TYPES.get(field.field_type, field.field_type)})"
+    skipped = sorted(staging_fields.keys() - columns.keys())
+    if skipped:
+        print(f"Not merging columns missing from or incompatible with {target}: {', '.join(skipped)}")
+    return columns
+
+
+def merge_to_bigquery(config: dict[str, str], df: pd.DataFrame) -> None:
+    """Upsert time entries into the timesheets table, keyed on `id`.
+
+    The changed rows are loaded into a staging table which is then merged into the target and dropped. Only
+    columns the target already has are merged, cast to the target's types.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        df (pd.DataFrame): Changed time entries
+
+    """
+    staging_config = {**config, "table_name": f"{config['table_name']}_staging"}
+    write_parquet_to_bigquery(staging_config, df, TIMESHEETS_TYPES, "WRITE_TRUNCATE")
+
+    target = f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}"
+    staging = f"{config['gcp_project']}.{config['dataset_id']}.{staging_config['table_name']}"
+    client = bigquery.Client(project=config["gcp_project"])
+    columns = get_merge_columns(client, target, staging)
+    merge_query = f"""
+    MERGE `{target}` T
+    USING `{staging}` S
+    ON T.id = S.id
+    WHEN MATCHED THEN
+      UPDATE SET {", ".join(f"`{column}` = {source}" for column, source in columns.items())}
+    WHEN NOT MATCHED THEN
+      INSERT ({", ".join(f"`{column}`" for column in columns)}) VALUES ({", ".join(columns.values())})
+    """  # noqa: S608
+    client.query(merge_query, location=config["location"]).result()
+    client.delete_table(staging, not_found_ok=True)
+
+
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Run Harvest Timesheets data pipeline.
 
@@ -68,20 +299,27 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
         context (dict): Context dictionary
 
     """
-
-    def get_utilisation(row: pd.Series) -> float:
-        return 0 if row["client_name"] in CLIENTS or row["task_name"] in TASKS else row["hours"]
-
     service = "Data Pipeline - Harvest Timesheets"
     config = load_config(project_id, service)
 
-    pages, _ = get_harvest_pages(config["url"], config["headers"])
-    timesheets_df = asyncio.run(get_all_data(config["url"], config["headers"], pages, "time_entries", batch_size=10))
-    timesheets_df = find_and_flatten_columns(timesheets_df)
-    timesheets_df["spent_date"] = pd.to_datetime(timesheets_df["spent_date"], format="%Y-%m-%d")
-    timesheets_df["utilisation"] = timesheets_df.apply(lambda row: get_utilisation(row), axis=1)
+    high_water_mark = get_high_water_mark(config) if config["sync_mode"] == "incremental" else None
+    if is_full_sync(config, high_water_mark):
+        print("Running full sync")
+        if config["load_mode"] == "streaming":
+            pages, _ = get_harvest_pages(config["url"], config["headers"])
+            batches = iter_batches(config["url"], config["headers"], pages, "time_entries")
+            stream_to_bigquery(config, (transform_timesheets(batch) for batch in batches), bigquery_schema(TIMESHEETS_TYPES))
+        else:
+            write_parquet_to_bigquery(config, get_timesheets(config["url"], config["headers"]), TIMESHEETS_TYPES, "WRITE_TRUNCATE")
+        return
 
-    write_to_bigquery(config, timesheets_df, "WRITE_TRUNCATE")
+    print(f"Running incremental sync from {high_water_mark}")
+    url = config["url"].replace("?page=", f"?updated_since={high_water_mark}&page=")
+    timesheets_df = get_timesheets(url, config["headers"])
+    if timesheets_df.empty:
+        print("No changed time entries")
+        return
+    merge_to_bigquery(config, timesheets_df)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""Tests for typing Harvest time entries for a Parquet load."""
+
+import io
+from datetime import UTC, date, datetime
+
+import main
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bigquery_parquet import BIGQUERY_TYPES, bigquery_schema, to_arrow
+
+TIME_ENTRIES = [
+    {
+        "id": 1,
+        "spent_date": "2024-01-02",
+        "hours": 7.5,
+        "rounded_hours": 7.5,
+        "billable": True,
+        "billable_rate": 850.0,
+        "cost_rate": None,
+        "is_locked": False,
+        "locked_reason": None,
+        "created_at": "2024-01-02T17:00:00Z",
+        "updated_at": "2024-01-02T17:00:00Z",
+        "user_id": 3,
+        "user_name": "Ada",
+        "client_id": 11,
+        "client_name": "Acme",
+        "client_currency": "GBP",
+        "project_id": 21,
+        "project_name": "Discovery",
+        "project_code": None,
+        "task_id": 31,
+        "task_name": "Delivery",
+        "user_assignment_id": 41,
+        "task_assignment_id": 51,
+        "invoice_id": None,
+    },
+    {
+        "id": 2,
+        "spent_date": "2024-01-03",
+        "hours": 1.0,
+        "rounded_hours": 1.0,
+        "billable": None,
+        "billable_rate": None,
+        "cost_rate": None,
+        "is_locked": True,
+        "locked_reason": "Item Invoiced",
+        "created_at": "2024-01-03T09:00:00Z",
+        "updated_at": "2024-01-04T09:00:00Z",
+        "user_id": 3,
+        "user_name": "Ada",
+        "client_id": 12,
+        "client_name": "TPXimpact",
+        "client_currency": "GBP",
+        "project_id": 22,
+        "project_name": "Internal",
+        "project_code": "INT",
+        "task_id": 32,
+        "task_name": "Travel Time",
+        "user_assignment_id": 42,
+        "task_assignment_id": 52,
+        "invoice_id": 61,
+    },
+]
+
+
+def get_timesheets_df() -> pd.DataFrame:
+    return main.transform_timesheets(pd.DataFrame(TIME_ENTRIES))
+
+
+def test_declared_columns_get_their_types() -> None:
+    schema = {field.name: field.type for field in to_arrow(get_timesheets_df(), main.TIMESHEETS_TYPES).schema}
+
+    assert {name: schema[name] for name in main.TIMESHEETS_TYPES} == main.TIMESHEETS_TYPES
+    assert schema["is_locked"] == pa.bool_()
+
+
+def test_values_keep_their_meaning() -> None:
+    rows = to_arrow(get_timesheets_df(), main.TIMESHEETS_TYPES).to_pylist()
+
+    assert [row["spent_date"] for row in rows] == [date(2024, 1, 2), date(2024, 1, 3)]
+    assert [row["updated_at"] for row in rows] == [datetime(2024, 1, 2, 17, tzinfo=UTC), datetime(2024, 1, 4, 9, tzinfo=UTC)]
+    assert [row["invoice_id"] for row in rows] == [None, 61]
+    assert [row["billable"] for row in rows] == [True, None]
+    assert [row["billable_rate"] for row in rows] == [850.0, None]
+    assert [row["cost_rate"] for row in rows] == [None, None]
+    assert [row["utilisation"] for row in rows] == [7.5, 0.0]
+
+
+def test_timestamp_strings_are_parsed() -> None:
+    df = pd.DataFrame(TIME_ENTRIES)[["id", "created_at"]]
+
+    assert to_arrow(df, main.TIMESHEETS_TYPES).column("created_at").to_pylist()[0] == datetime(2024, 1, 2, 17, tzinfo=UTC)
+
+
+def test_parquet_keeps_the_declared_types() -> None:
+    table = to_arrow(get_timesheets_df(), main.TIMESHEETS_TYPES)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+
+    assert pq.read_table(buffer).schema.equals(table.schema)
+
+
+def test_bigquery_schema_covers_every_declared_column() -> None:
+    schema = {field.name: field.field_type for field in bigquery_schema(main.TIMESHEETS_TYPES)}
+
+    assert schema == {name: BIGQUERY_TYPES[type_] for name, type_ in main.TIMESHEETS_TYPES.items()}
+    assert schema["spent_date"] == "DATE"
+    assert schema["billable"] == "BOOL"
+    assert schema["invoice_id"] == "INT64"
+    assert schema["created_at"] == "TIMESTAMP"
@@ -1,19 +1,21 @@
 """Hibob Holiday Balances data pipeline."""
 
-import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
 from os import getenv
 
 import pandas as pd
 import requests
 from data_pipeline_tools.auth import hibob_headers
-from data_pipeline_tools.util import write_to_bigquery
+from data_pipeline_tools.util import read_from_bigquery, write_to_bigquery
+from hibob_session import RateLimitedSession
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
 CURRENT_YEAR = datetime.now().year
-POLICY_TYPES = []
 TPX_POLICY_TYPE = "TPXimpact Holiday"
+MAX_WORKERS = int(getenv("HIBOB_MAX_WORKERS") or 10)
+POLICY_CACHE_TTL_DAYS = int(getenv("POLICY_CACHE_TTL_DAYS") or 30)
 
 
 def load_config(project_id: str, service: str) -> dict[str, str]:
@@ -33,17 +35,95 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "dataset_id": getenv("DATASET_ID"),
         "location": getenv("TABLE_LOCATION"),
+        "gcp_project": project_id,
         "headers": hibob_headers(project_id, service),
     }
 
 
-def get_employee_ids(config: dict[str:str]) -> list[str]:
-    """Get employee IDs.
+def get_policy_cache_config(config: dict[str:str]) -> dict[str:str]:
+    """Get the config of the table caching which policy type each employee's balance was found under.
 
     Args:
     ----
         config (dict[str:str]): Config
 
+    Returns:
+    -------
+        dict[str:str]: Cache table config
+
+    """
+    return {**config, "table_name": f"{config['table_name']}_policy_types"}
+
+
+def load_policy_cache(config: dict[str:str]) -> dict[str, dict]:
+    """Load the employee to policy type cache, skipping entries not confirmed within POLICY_CACHE_TTL_DAYS.
+
+    Args:
+    ----
+        config (dict[str:str]): Config
+
+    Returns:
+    -------
+        dict[str, dict]: Policy type and resolution time by employee ID, empty if the cache table does not exist yet
+
+    """
+    cache_config = get_policy_cache_config(config)
+    query = f"""
+    SELECT employee_id, policy_type, resolved_at
+    FROM `{cache_config['gcp_project']}.{cache_config['dataset_id']}.{cache_config['table_name']}`
+    WHERE resolved_at > TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {POLICY_CACHE_TTL_DAYS} DAY)
+    """  # noqa: S608
+    try:
+        cache_df = read_from_bigquery(cache_config["gcp_project"], query)
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to load policy type cache: {e}")
+        return {}
+    return {row["employee_id"]: {"policy_type": row["policy_type"], "resolved_at": row["resolved_at"]} for row in cache_df.to_dict("records")}
+
+
+def save_policy_cache(config: dict[str:str], policy_cache: dict[str, dict]) -> None:
+    """Save the employee to policy type cache.
+
+    Args:
+    ----
+        config (dict[str:str]): Config
+        policy_cache (dict[str, dict]): Policy type and resolution time by employee ID
+
+    """
+    if policy_cache:
+        cache_df = pd.DataFrame([{"employee_id": employee_id, **entry} for employee_id, entry in policy_cache.items()])
+        write_to_bigquery(get_policy_cache_config(config), cache_df, "WRITE_TRUNCATE")
+
+
+def get_json(response: requests.Response) -> dict:
+    """Get the body of a successful response.
+
+    Args:
+    ----
+        response (requests.Response): Response
+
+    Returns:
+    -------
+        dict: Response body, empty if the request failed or the body is not JSON
+
+    """
+    if not response.ok:
+        print(f"{response.status_code} from {response.url}: {response.text}")
+        return {}
+    try:
+        return response.json()
+    except ValueError:
+        print(f"Invalid JSON from {response.url}: {response.text}")
+        return {}
+
+
+def get_employee_ids(session: RateLimitedSession) -> list[str]:
+    """Get employee IDs.
+
+    Args:
+    ----
+        session (RateLimitedSession): HiBob session
+
     Returns:
     -------
         list[str]: Employee IDs
@@ -56,46 +136,39 @@ def get_employee_ids(config: dict[str:str]) -> list[str]:
         "showInactive": False,
         "humanReadable": "REPLACE",
     }
-    response = requests.post(
-        url,
-        headers=config["headers"],
-        json=payload,
-        timeout=10,
-    )
+    response = session.request("POST", url, json=payload)
+    response.raise_for_status()
     return [employee["id"] for employee in response.json()["employees"]]
 
 
-def find_employee_balance(config: dict[str:str], url: str) -> dict[str:str]:
+def find_employee_balance(session: RateLimitedSession, url: str, policy_types: list[str]) -> tuple[dict[str:str], str | None]:
     """Find employee balance on Hibob.
 
     Args:
     ----
-        config (dict[str:str]): Config
+        session (RateLimitedSession): HiBob session
         url (str): Partially formatted URL
+        policy_types (list[str]): Holiday policy types to try, in order
+
+    Returns:
+    -------
+        tuple[dict[str:str], str | None]: Employee balance and the policy type it was found under
 
     """
-    for policy_type in POLICY_TYPES:
-        response = requests.get(
-            url.format(policy_type=policy_type),
-            headers=config["headers"],
-            timeout=10,
-        )
-        try:
-            if response.json():
-                return response.json()
-        except Exception as e:  # noqa: BLE001
-            print(response)
-            print(e)
+    for policy_type in policy_types:
+        balance = get_json(session.request("GET", url.format(policy_type=policy_type)))
+        if balance:
+            return balance, policy_type
     print(f"Unable to get balance for {url}")
-    return {}
+    return {}, None
 
 
-def get_policy_types(config: dict[str:str]) -> list[str]:
+def get_policy_types(session: RateLimitedSession) -> list[str]:
     """Get policy types from Hibob.
 
     Args:
     ----
-        config (dict[str:str]): Config
+        session (RateLimitedSession): HiBob session
 
     Returns:
     -------
@@ -103,17 +176,29 @@ def get_policy_types(config: dict[str:str]) -> list[str]:
 
     """
     url = "https://api.hibob.com/v1/timeoff/policy-types"
-    response = requests.get(url, headers=config["headers"], timeout=10)
+    response = session.request("GET", url)
+    response.raise_for_status()
     return [policy_type.strip() for policy_type in response.json()["policyTypes"] if "holiday" in policy_type.lower()]
 
 
-def get_employee_balance(employee_id: str, config: dict[str:str]) -> dict[str:str]:
+def get_employee_balance(
+    employee_id: str,
+    session: RateLimitedSession,
+    policy_types: list[str],
+    policy_cache: dict[str, dict],
+) -> dict[str:str]:
     """Get employee balance from Hibob.
 
+    When the TPXimpact Holiday balance is empty, the policy type cached for the employee is tried first and,
+    when it answers, its resolution time is refreshed so it does not expire while it keeps working. A cached
+    policy type that fails or answers empty is dropped and the remaining policy types are probed in order.
+
     Args:
     ----
         employee_id (str): Employee ID
-        config (dict[str:str]): Config
+        session (RateLimitedSession): HiBob session
+        policy_types (list[str]): Holiday policy types to fall back to
+        policy_cache (dict[str, dict]): Policy type cache, updated in place
 
     Returns:
     -------
@@ -121,20 +206,17 @@ def get_employee_balance(employee_id: str, config: dict[str:str]) -> dict[str:st
 
     """
     url = "https://api.hibob.com/v1/timeoff/employees/{employee_id}/balance?policyType={policy_type}&date={year}-12-31"
-    response = requests.get(
-        url.format(employee_id=employee_id, policy_type=TPX_POLICY_TYPE, year=CURRENT_YEAR),
-        headers=config["headers"],
-        timeout=10,
-    )
-    if int(response.headers["X-RateLimit-Remaining"]) == 1:
-        time.sleep(int(response.headers["X-RateLimit-Reset"]) - time.time() + 1)
-    try:
-        if not response.json():
-            return find_employee_balance(config, url.format(employee_id=employee_id, year=CURRENT_YEAR, policy_type="{policy_type}"))
-    except:  # noqa: E722
-        print(response.text)
-        return {}
-    return response.json()
+    response = session.request("GET", url.format(employee_id=employee_id, policy_type=TPX_POLICY_TYPE, year=CURRENT_YEAR))
+    balance = get_json(response)
+    if not balance and response.ok:
+        cached = policy_cache.pop(employee_id, None)
+        if cached and cached["policy_type"] in policy_types:
+            policy_types = [cached["policy_type"], *(policy_type for policy_type in policy_types if policy_type != cached["policy_type"])]
+        balance_url = url.format(employee_id=employee_id, year=CURRENT_YEAR, policy_type="{policy_type}")
+        balance, policy_type = find_employee_balance(session, balance_url, policy_types)
+        if policy_type:
+            policy_cache[employee_id] = {"policy_type": policy_type, "resolved_at": datetime.now(UTC)}
+    return balance
 
 
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
@@ -150,10 +232,14 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     """
     service = "Data Pipeline - HiBob Holiday Balances"
     config = load_config(project_id, service)
-    global POLICY_TYPES  # noqa: PLW0603
-    POLICY_TYPES = get_policy_types(config)
-    POLICY_TYPES.remove(TPX_POLICY_TYPE)
-    balances = [get_employee_balance(employee_id, config) for employee_id in get_employee_ids(config)]
+    session = RateLimitedSession(config["headers"], MAX_WORKERS)
+    policy_types = [policy_type for policy_type in get_policy_types(session) if policy_type != TPX_POLICY_TYPE]
+    policy_cache = load_policy_cache(config)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        balances = list(
+            executor.map(lambda employee_id: get_employee_balance(employee_id, session, policy_types, policy_cache), get_employee_ids(session)),
+        )
+    save_policy_cache(config, policy_cache)
     write_to_bigquery(
         config,
         pd.DataFrame([balance for balance in balances if balance]),
@@ -0,0 +1,73 @@
+"""Tests for resolving each employee's HiBob holiday policy type."""
+
+import json
+import threading
+from datetime import UTC, datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+
+import main
+import requests
+from hibob_session import RateLimitedSession
+
+POLICY_TYPES = ["Holiday A", "Holiday B", "Holiday C"]
+STALE = datetime.now(UTC) - timedelta(days=main.POLICY_CACHE_TTL_DAYS - 1)
+
+
+class FakeBalances:
+    """HiBob balance endpoint answering each employee's balance under a single policy type."""
+
+    def __init__(self, policy_types: dict[str, str]) -> None:
+        self.policy_types = policy_types
+        self.calls: list[tuple[str, str]] = []
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, timeout: float) -> requests.Response:
+        employee_id = urlparse(url).path.split("/")[-2]
+        policy_type = parse_qs(urlparse(url).query)["policyType"][0]
+        with self.lock:
+            self.calls.append((employee_id, policy_type))
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        balance = {"employeeId": employee_id, "policyType": policy_type} if self.policy_types.get(employee_id) == policy_type else {}
+        response._content = json.dumps(balance).encode()  # noqa: SLF001
+        return response
+
+
+def get_balance(policy_types: dict[str, str], policy_cache: dict[str, dict]) -> tuple[dict, list[str]]:
+    balances = FakeBalances(policy_types)
+    session = RateLimitedSession({}, main.MAX_WORKERS)
+    session.session = balances
+    balance = main.get_employee_balance("1", session, POLICY_TYPES, policy_cache)
+    return balance, [policy_type for _, policy_type in balances.calls]
+
+
+def test_confirmed_policy_type_is_refreshed() -> None:
+    policy_cache = {"1": {"policy_type": "Holiday C", "resolved_at": STALE}}
+
+    balance, probed = get_balance({"1": "Holiday C"}, policy_cache)
+
+    assert balance["policyType"] == "Holiday C"
+    assert probed == [main.TPX_POLICY_TYPE, "Holiday C"]
+    assert policy_cache["1"]["policy_type"] == "Holiday C"
+    assert policy_cache["1"]["resolved_at"] > STALE
+
+
+def test_stale_policy_type_is_replaced() -> None:
+    policy_cache = {"1": {"policy_type": "Holiday C", "resolved_at": STALE}}
+
+    balance, probed = get_balance({"1": "Holiday B"}, policy_cache)
+
+    assert balance["policyType"] == "Holiday B"
+    assert probed == [main.TPX_POLICY_TYPE, "Holiday C", "Holiday A", "Holiday B"]
+    assert policy_cache["1"]["policy_type"] == "Holiday B"
+
+
+def test_tpx_balance_needs_no_policy_type() -> None:
+    policy_cache = {}
+
+    balance, probed = get_balance({"1": main.TPX_POLICY_TYPE}, policy_cache)
+
+    assert balance["policyType"] == main.TPX_POLICY_TYPE
+    assert probed == [main.TPX_POLICY_TYPE]
+    assert policy_cache == {}
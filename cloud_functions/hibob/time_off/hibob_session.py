@@ -0,0 +1,102 @@
+"""HiBob session shared by concurrent workers, throttled to HiBob's rate limit."""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MAX_RETRIES = 5
+TOO_MANY_REQUESTS = 429
+
+
+class RateLimitedSession:
+    """Pooled HiBob session shared by all workers, throttled by a token bucket.
+
+    The bucket holds the requests HiBob reports as remaining in `X-RateLimit-Remaining` until
+    `X-RateLimit-Reset`. Responses to requests that were already in flight only ever lower the count within
+    a window, so the bucket never hands out more than HiBob allows. Once it runs out, or HiBob answers 429,
+    every worker waits for the reset before sending anything else.
+    """
+
+    def __init__(self, headers: dict[str, str], pool_size: int, timeout: float = 10) -> None:
+        """Create the session.
+
+        Args:
+        ----
+            headers (dict[str, str]): HiBob headers
+            pool_size (int): Number of pooled connections, at least the number of workers
+            timeout (float): Request timeout in seconds
+
+        """
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._tokens = None
+        self._reset = 0.0
+        self._sent = 0
+
+    def _acquire(self) -> int:
+        while True:
+            with self._lock:
+                wait = self._reset - time.time()
+                if self._tokens is None or self._tokens > 0 or wait <= 0:
+                    if wait <= 0:
+                        self._tokens = None
+                    elif self._tokens is not None:
+                        self._tokens -= 1
+                    self._sent += 1
+                    return self._sent
+            time.sleep(wait)
+
+    def _update(self, response: requests.Response, sent: int) -> None:
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            # Requests sent after this one may not be counted in its headers yet.
+            tokens = int(remaining) - (self._sent - sent)
+            if float(reset) > self._reset:
+                self._tokens, self._reset = tokens, float(reset)
+            elif float(reset) == self._reset:
+                self._tokens = tokens if self._tokens is None else min(self._tokens, tokens)
+
+    def _pause(self, response: requests.Response, attempt: int) -> None:
+        retry_after = response.headers.get("Retry-After")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if retry_after:
+            resume = time.time() + float(retry_after)
+        elif reset:
+            resume = float(reset)
+        else:
+            resume = time.time() + 2**attempt
+        with self._lock:
+            self._tokens, self._reset = 0, max(self._reset, resume)
+
+    def request(self, method: str, url: str, **kwargs: dict) -> requests.Response:
+        """Send a request once the rate limit allows it, retrying when HiBob answers 429.
+
+        Args:
+        ----
+            method (str): HTTP method
+            url (str): URL
+            **kwargs (dict): Passed on to `requests.Session.request`
+
+        Returns:
+        -------
+            requests.Response: Response
+
+        """
+        for attempt in range(MAX_RETRIES):
+            sent = self._acquire()
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            if response.status_code != TOO_MANY_REQUESTS:
+                self._update(response, sent)
+                return response
+            print(f"Rate limited on {url}, retrying")
+            self._pause(response, attempt)
+        response.raise_for_status()
+        return response
@@ -1,17 +1,23 @@
 """Hibob Time Off data pipeline."""
 
-import copy
-import json
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from os import getenv
 
-import httpx
+import numpy as np
 import pandas as pd
 from data_pipeline_tools.auth import hibob_headers
 from data_pipeline_tools.util import write_to_bigquery
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from hibob_session import RateLimitedSession
+from working_days import expand_working_days
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
+HISTORY_DAYS = 10000
+MAX_WORKERS = 8
+
 
 def load_config(project_id: str, service: str) -> dict[str, str]:
     """Load config for the pipeline.
@@ -30,7 +36,11 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "dataset_id": getenv("DATASET_ID"),
         "location": getenv("TABLE_LOCATION"),
+        "gcp_project": project_id,
         "headers": hibob_headers(project_id, service),
+        "chunk_days": int(getenv("WHOSOUT_CHUNK_DAYS") or 365),
+        "rolling_window_days": int(getenv("WHOSOUT_ROLLING_WINDOW_DAYS") or 0),
+        "timeout": float(getenv("WHOSOUT_TIMEOUT") or 60),
     }
 
 
@@ -47,60 +57,84 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     """
     service = "Data Pipeline - HiBob Time Off"
     config = load_config(project_id, service)
-    write_to_bigquery(config, get_holidays(config, httpx.Client()), "WRITE_TRUNCATE")
+    start_date, end_date = get_window(config)
+    session = RateLimitedSession(config["headers"], MAX_WORKERS, timeout=config["timeout"])
+    holidays_df = get_holidays(config, session, start_date, end_date)
 
+    if config["rolling_window_days"] and has_rows(config):
+        merge_to_bigquery(config, holidays_df, start_date)
+    else:
+        write_to_bigquery(config, holidays_df, "WRITE_TRUNCATE")
 
-def get_holidays(config: dict, client: httpx.Client) -> pd.DataFrame:
-    """Get holidays from Hibob.
+
+def get_window(config: dict) -> tuple[date, date]:
+    """Get the date range to request from whosout.
 
     Args:
     ----
         config (dict[str:str]): Config
-        client (httpx.Client): HTTP client
+
+    Returns:
+    -------
+        tuple[date, date]: Start and end dates, limited to the rolling window if one is configured
 
     """
+    today = datetime.now().date()
+    return today - timedelta(days=config["rolling_window_days"] or HISTORY_DAYS), today + timedelta(days=HISTORY_DAYS)
 
-    def expand_holidays_rows(df: pd.DataFrame) -> pd.DataFrame:
-        # When an assignment is entered, it can be put in for a single day or multiple.
-        # For entries spanning across multiple days, this function converts to single day entries and returns the dataframe.
-        edited_rows = []
-        for _, row in df[df["startDate"] != df["endDate"]].iterrows():
-            # get the times
-            end_date = datetime.strptime(row["endDate"], "%Y-%m-%d")
-            start_date = datetime.strptime(row["startDate"], "%Y-%m-%d")
 
-            dates = get_weekdays(start_date, end_date)
+def get_whosout(session: RateLimitedSession, start_date: date, end_date: date) -> list[dict]:
+    """Get time off requests overlapping a date range.
 
-            first_row = copy.copy(row)
-            if len(dates) > 1:
-                first_row["endPortion"] = "all_day"
-                middle_rows = copy.copy(row)
-                middle_rows["startPortion"] = "all_day"
-                middle_rows["endPortion"] = "all_day"
-                for date in dates[1:-1]:
-                    edited_rows.append(set_dates_in_row(copy.copy(middle_rows), date))  # noqa: PERF401
-                last_row = copy.copy(row)
-                last_row["startPortion"] = "all_day"
-                edited_rows.append(set_dates_in_row(copy.copy(last_row), dates[-1]))
-            edited_rows.append(set_dates_in_row(first_row, dates[0]))
+    Args:
+    ----
+        session (RateLimitedSession): HiBob session
+        start_date (date): Range start
+        end_date (date): Range end, inclusive
 
-        return pd.concat([df[df["startDate"] == df["endDate"]], pd.DataFrame(edited_rows)])
+    Returns:
+    -------
+        list[dict]: Time off requests
 
-    def find_hours(row: pd.Series) -> int:
-        if row["startPortion"] == "all_day" and row["endPortion"] == "all_day":
-            return 8
-        return 4
+    """
+    response = session.request(
+        "GET",
+        "https://api.hibob.com/v1/timeoff/whosout",
+        params={
+            "from": start_date.strftime("%Y-%m-%d"),
+            "to": end_date.strftime("%Y-%m-%d"),
+            "includeHourly": "false",
+            "includePrivate": "true",
+        },
+    )
+    response.raise_for_status()
+    return response.json()["outs"]
 
-    start_timestamp = (datetime.now() - timedelta(days=10000)).strftime("%Y-%m-%d")
-    end_timestamp = (datetime.now() + timedelta(days=10000)).strftime("%Y-%m-%d")
 
-    url = f"https://api.hibob.com/v1/timeoff/whosout?from={start_timestamp}&to={end_timestamp}&includeHourly=false&includePrivate=true"
+def get_holidays(config: dict, session: RateLimitedSession, start_date: date, end_date: date) -> pd.DataFrame:
+    """Get holidays from Hibob.
 
-    resp = json.loads(client.get(url, headers=config["headers"], timeout=None).text)
+    The range is requested in `chunk_days` chunks concurrently, requests spanning two chunks are kept once.
+    Chunks answered with 429 are retried once HiBob's rate limit resets.
 
-    df = expand_holidays_rows(pd.DataFrame(resp["outs"]))  # noqa: PD901
+    Args:
+    ----
+        config (dict[str:str]): Config
+        session (RateLimitedSession): HiBob session
+        start_date (date): Range start
+        end_date (date): Range end, inclusive
 
-    df["holiday_hours"] = df.apply(lambda row: find_hours(row), axis=1)
+    """
+    chunks = [
+        (chunk_start, min(chunk_start + timedelta(days=config["chunk_days"] - 1), end_date))
+        for chunk_start in pd.date_range(start_date, end_date, freq=f"{config['chunk_days']}D").date
+    ]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        outs = [out for chunk in executor.map(lambda chunk: get_whosout(session, *chunk), chunks) for out in chunk]
+
+    df = expand_holidays_rows(pd.DataFrame(outs).drop_duplicates(subset="requestId"))  # noqa: PD901
+
+    df["holiday_hours"] = np.where((df["startPortion"] == "all_day") & (df["endPortion"] == "all_day"), 8, 4)
     df["holiday_days"] = df["holiday_hours"] / 8
     df["allocation_hours"] = 0
     df["allocation_days"] = 0
@@ -123,45 +157,94 @@ def get_holidays(config: dict, client: httpx.Client) -> pd.DataFrame:
     )
 
 
-def set_dates_in_row(row: pd.Series, date: datetime) -> pd.Series:
-    """Set the start and end dates in a row to a specific date.
+def has_rows(config: dict) -> bool:
+    """Check whether the time off table already holds a previous load.
 
     Args:
     ----
-        row (pd.Series): Row to update
-        date (datetime): Date to set
+        config (dict[str:str]): Config
 
     Returns:
     -------
-        pd.Series: Updated row
+        bool: True if the table has rows, False if it is empty or does not exist yet
 
     """
-    string_date = datetime.strftime(date, "%Y-%m-%d")
-    row["startDate"] = string_date
-    row["endDate"] = string_date
-    return row
+    client = bigquery.Client(project=config["gcp_project"])
+    try:
+        table = client.get_table(f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}")
+    except NotFound:
+        return False
+    return bool(table.num_rows)
 
 
-def get_weekdays(start_date: datetime, end_date: datetime) -> list:
-    """Get list of weekdays between start and end dates.
+def merge_to_bigquery(config: dict, df: pd.DataFrame, window_start: date) -> None:
+    """Replace the rolling window in the time off table, keeping history from previous loads.
+
+    Rows ending before the window are kept unless their request was fetched again, everything else is replaced.
+    The staging table is loaded with the target's schema, so only columns the target has are inserted.
 
     Args:
     ----
-        start_date (datetime): Start date
-        end_date (datetime): End date
+        config (dict[str:str]): Config
+        df (pd.DataFrame): Holidays in the rolling window
+        window_start (date): First day of the rolling window
+
+    """
+    client = bigquery.Client(project=config["gcp_project"])
+    target = f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}"
+    staging = f"{target}_staging"
+    schema = [field for field in client.get_table(target).schema if field.name in df]
+    dropped = sorted(set(df.columns) - {field.name for field in schema})
+    if dropped:
+        print(f"Not merging columns missing from {target}: {', '.join(dropped)}")
+    load_config = bigquery.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
+    client.load_table_from_dataframe(df[[field.name for field in schema]], staging, job_config=load_config, location=config["location"]).result()
+
+    columns = ", ".join(f"`{field.name}`" for field in schema)
+    merge_query = f"""
+    BEGIN TRANSACTION;
+    DELETE FROM `{target}`
+    WHERE end_date >= @window_start OR id IN (SELECT id FROM `{staging}`);
+    INSERT INTO `{target}` ({columns})
+    SELECT {columns} FROM `{staging}`;
+    COMMIT TRANSACTION;
+    """  # noqa: S608
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("window_start", "STRING", window_start.strftime("%Y-%m-%d"))],
+    )
+    client.query(merge_query, job_config=job_config, location=config["location"]).result()
+    client.delete_table(staging, not_found_ok=True)
+
+
+def expand_holidays_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Expand time off spanning multiple days to single day entries.
+
+    The first day keeps the requested start portion and the last day the requested end portion,
+    every other day is taken in full. Per request, rows are ordered middle days, last day, first day.
+
+    Args:
+    ----
+        df (pd.DataFrame): Time off requests
 
     Returns:
     -------
-        list: List of weekday dates
+        pd.DataFrame: Single day time off entries
 
     """
-    start = copy.copy(start_date)
-    dates_list = []
-    while start <= end_date:
-        if start.weekday() < 5:  # noqa: PLR2004
-            dates_list.append(start)
-        start = start + timedelta(days=1)
-    return dates_list
+    rows_to_edit = df[df["startDate"] != df["endDate"]]
+    positions, weekdays = expand_working_days(rows_to_edit["startDate"], rows_to_edit["endDate"])
+
+    counts = np.bincount(positions, minlength=len(rows_to_edit))
+    day_number = np.arange(len(positions)) - np.repeat(counts.cumsum() - counts, counts)
+    order = np.lexsort((np.where(day_number == 0, counts[positions], day_number), positions))
+    positions, weekdays, day_number = positions[order], weekdays[order], day_number[order]
+
+    date_strings = np.datetime_as_string(weekdays, unit="D").astype(object)
+    edited_rows = rows_to_edit.iloc[positions].assign(startDate=date_strings, endDate=date_strings)
+    edited_rows["startPortion"] = edited_rows["startPortion"].where(day_number == 0, "all_day")
+    edited_rows["endPortion"] = edited_rows["endPortion"].where(day_number == counts[positions] - 1, "all_day")
+
+    return pd.concat([df[df["startDate"] == df["endDate"]], edited_rows])
 
 
 if __name__ == "__main__":
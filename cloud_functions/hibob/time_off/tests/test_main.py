@@ -0,0 +1,72 @@
+"""Tests for fetching HiBob time off in concurrent chunks."""
+
+import json
+import threading
+from datetime import date
+
+import main
+import requests
+from hibob_session import RateLimitedSession
+
+
+def out(request_id: int, name: str, start_date: str, end_date: str, portion: str = "all_day") -> dict:
+    return {
+        "requestId": request_id,
+        "employeeDisplayName": name,
+        "startDate": start_date,
+        "endDate": end_date,
+        "startPortion": portion,
+        "endPortion": portion,
+    }
+
+
+OUTS = [out(1, "Ada", "2024-01-02", "2024-01-02"), out(2, "Ada", "2024-01-09", "2024-01-12"), out(3, "Bob", "2024-01-25", "2024-01-25", "morning")]
+
+
+class FakeWhosout:
+    """HiBob whosout endpoint that answers the first requests with 429."""
+
+    def __init__(self, throttled: int = 0) -> None:
+        self.throttled = throttled
+        self.calls: list[tuple[str, str]] = []
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, timeout: float, params: dict) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        with self.lock:
+            self.calls.append((params["from"], params["to"]))
+            if self.throttled:
+                self.throttled -= 1
+                response.status_code = 429
+                response.headers["Retry-After"] = "0"
+                return response
+        outs = [out for out in OUTS if out["startDate"] <= params["to"] and out["endDate"] >= params["from"]]
+        response.status_code = 200
+        response._content = json.dumps({"outs": outs}).encode()  # noqa: SLF001
+        return response
+
+
+def get_session(whosout: FakeWhosout) -> RateLimitedSession:
+    session = RateLimitedSession({}, main.MAX_WORKERS)
+    session.session = whosout
+    return session
+
+
+def test_chunks_are_merged_once_per_request() -> None:
+    whosout = FakeWhosout()
+
+    holidays_df = main.get_holidays({"chunk_days": 10}, get_session(whosout), date(2024, 1, 1), date(2024, 1, 30))
+
+    assert sorted(whosout.calls) == [("2024-01-01", "2024-01-10"), ("2024-01-11", "2024-01-20"), ("2024-01-21", "2024-01-30")]
+    assert holidays_df.groupby("id").size().to_dict() == {1: 1, 2: 4, 3: 1}
+    assert holidays_df.set_index("id").loc[3, "holiday_hours"] == 4
+
+
+def test_rate_limited_chunk_is_retried() -> None:
+    whosout = FakeWhosout(throttled=1)
+
+    holidays_df = main.get_holidays({"chunk_days": 10}, get_session(whosout), date(2024, 1, 1), date(2024, 1, 30))
+
+    assert len(whosout.calls) == 4
+    assert sorted(holidays_df["id"].unique()) == [1, 2, 3]
@@ -0,0 +1,79 @@
+"""Working-day calendar shared by the Forecast and HiBob pipelines."""
+
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from data_pipeline_tools.holiday import get_uk_holidays
+
+WEEKMASK = "1111100"
+
+
+@lru_cache
+def get_calendar(first_year: int | None = None, last_year: int | None = None) -> np.busdaycalendar:
+    """Get a Monday to Friday calendar, built once per run.
+
+    Queries against it are O(log n) in the number of bank holidays, which it keeps as a sorted array.
+
+    Args:
+    ----
+        first_year (int | None): First year of UK bank holidays to skip, None for weekdays only
+        last_year (int | None): Year after the last year of UK bank holidays to skip
+
+    Returns:
+    -------
+        np.busdaycalendar: Working-day calendar
+
+    """
+    if first_year is None:
+        return np.busdaycalendar(weekmask=WEEKMASK)
+    bank_holidays = pd.to_datetime([day for year in range(first_year, last_year) for day in get_uk_holidays(year)["spent_date"]])
+    return np.busdaycalendar(weekmask=WEEKMASK, holidays=bank_holidays.to_numpy().astype("datetime64[D]"))
+
+
+def get_working_days(start_date: date, end_date: date, calendar: np.busdaycalendar | None = None) -> np.ndarray:
+    """Get the working days between two dates.
+
+    Args:
+    ----
+        start_date (date): First day
+        end_date (date): Last day, inclusive
+        calendar (np.busdaycalendar | None): Calendar to use, weekdays only if None
+
+    Returns:
+    -------
+        np.ndarray: Working days as datetime64[D]
+
+    """
+    days = np.arange(np.datetime64(start_date, "D"), np.datetime64(end_date, "D") + 1)
+    return days[np.is_busday(days, busdaycal=calendar or get_calendar())]
+
+
+def expand_working_days(
+    start_dates: pd.Series,
+    end_dates: pd.Series,
+    calendar: np.busdaycalendar | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the working days between each pair of start and end dates.
+
+    Args:
+    ----
+        start_dates (pd.Series): Start dates as YYYY-MM-DD strings
+        end_dates (pd.Series): End dates as YYYY-MM-DD strings, inclusive
+        calendar (np.busdaycalendar | None): Calendar to use, weekdays only if None
+
+    Returns:
+    -------
+        tuple[np.ndarray, np.ndarray]: Position of the source span for every working day, and the working days themselves
+
+    """
+    calendar = calendar or get_calendar()
+    starts = pd.to_datetime(start_dates, format="%Y-%m-%d").to_numpy().astype("datetime64[D]")
+    ends = pd.to_datetime(end_dates, format="%Y-%m-%d").to_numpy().astype("datetime64[D]")
+    counts = np.busday_count(starts, ends + 1, busdaycal=calendar).clip(min=0)
+
+    positions = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(counts.cumsum() - counts, counts)
+    first_days = np.busday_offset(starts, 0, roll="forward", busdaycal=calendar)
+    return positions, np.busday_offset(first_days[positions], offsets, busdaycal=calendar)
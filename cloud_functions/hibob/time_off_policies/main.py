@@ -1,14 +1,17 @@
 """Hibob Time Off Policies data pipeline."""
 
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 
 import pandas as pd
-import requests
 from data_pipeline_tools.auth import hibob_headers
 from data_pipeline_tools.util import write_to_bigquery
+from hibob_session import RateLimitedSession
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
+MAX_WORKERS = int(getenv("HIBOB_MAX_WORKERS") or 10)
+
 
 def load_config(project_id: str, service: str) -> dict[str, str]:
     """Load config for the pipeline.
@@ -31,12 +34,12 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
     }
 
 
-def get_policy_types(config: dict[str:str]) -> list[str]:
+def get_policy_types(session: RateLimitedSession) -> list[str]:
     """Get list of available policy types.
 
     Args:
     ----
-        config (dict[str:str]): Config
+        session (RateLimitedSession): HiBob session
 
     Returns:
     -------
@@ -44,10 +47,74 @@ def get_policy_types(config: dict[str:str]) -> list[str]:
 
     """
     url = "https://api.hibob.com/v1/timeoff/policy-types"
-    response = requests.get(url, headers=config["headers"], timeout=10)
+    response = session.request("GET", url)
+    response.raise_for_status()
     return [policy_type.strip() for policy_type in response.json()["policyTypes"]]
 
 
+def get_policy_names(session: RateLimitedSession, policy_type: str) -> list[str]:
+    """Get the names of the policies of a policy type.
+
+    Args:
+    ----
+        session (RateLimitedSession): HiBob session
+        policy_type (str): Policy type
+
+    Returns:
+    -------
+        list[str]: Policy names
+
+    """
+    url = "https://api.hibob.com/v1/timeoff/policies/names"
+    response = session.request("GET", url, params={"policyTypeName": policy_type})
+    response.raise_for_status()
+    return response.json()["policies"]
+
+
+def get_policy(session: RateLimitedSession, policy_name: str) -> dict | None:
+    """Get the details of a policy.
+
+    Args:
+    ----
+        session (RateLimitedSession): HiBob session
+        policy_name (str): Policy name
+
+    Returns:
+    -------
+        dict | None: Policy, None if HiBob answered with an error for it
+
+    """
+    url = "https://api.hibob.com/v1/timeoff/policies"
+    response = session.request("GET", url, params={"policyName": policy_name})
+    try:
+        policy = response.json()
+    except ValueError:
+        policy = {}
+    if isinstance(policy, dict) and policy.get("error"):
+        print(f"Skipping policy {policy_name}: {policy['error']}")
+        return None
+    response.raise_for_status()
+    return policy
+
+
+def get_policies(session: RateLimitedSession) -> list[dict]:
+    """Get the details of every policy, each policy once, in the order HiBob lists them.
+
+    Args:
+    ----
+        session (RateLimitedSession): HiBob session
+
+    Returns:
+    -------
+        list[dict]: Policies
+
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        names_by_type = executor.map(lambda policy_type: get_policy_names(session, policy_type), get_policy_types(session))
+        policy_names = list(dict.fromkeys(name for names in names_by_type for name in names))
+        return [policy for policy in executor.map(lambda policy_name: get_policy(session, policy_name), policy_names) if policy]
+
+
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Run Hibob Time Off Policies data pipeline.
 
@@ -61,16 +128,7 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     """
     service = "Data Pipeline - HiBob Time Off Policies"
     config = load_config(project_id, service)
-    policies = []
-    for policy_type in get_policy_types(config):
-        policy_url = f"https://api.hibob.com/v1/timeoff/policies/names?policyTypeName={policy_type}"
-        response = requests.get(policy_url, headers=config["headers"], timeout=10)
-        for policy_name in response.json()["policies"]:
-            url = f"https://api.hibob.com/v1/timeoff/policies?policyName={policy_name}"
-            response = requests.get(url, headers=config["headers"], timeout=10)
-            if not response.json().get("error"):
-                policies.append(response.json())
-
+    policies = get_policies(RateLimitedSession(config["headers"], MAX_WORKERS))
     write_to_bigquery(config, pd.DataFrame(policies)[["name", "allowance"]], "WRITE_TRUNCATE")
 
 
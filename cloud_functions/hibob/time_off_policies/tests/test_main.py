@@ -0,0 +1,95 @@
+"""Tests for crawling HiBob time off policies."""
+
+import json
+import threading
+
+import main
+import pytest
+import requests
+from hibob_session import RateLimitedSession
+
+POLICY_NAMES = {
+    "Holiday": ["Standard holiday", "Part time holiday", "Retired holiday"],
+    "Sick leave": ["Sickness", "Standard holiday"],
+    "Parental": ["Maternity", "Sickness", "Paternity"],
+}
+
+
+class FakeHiBob:
+    """HiBob time off API, answering each URL's first requests with the status codes given for it."""
+
+    def __init__(self, failures: dict[str, list[int]] | None = None) -> None:
+        self.failures = failures or {}
+        self.calls: list[str] = []
+        self.lock = threading.Lock()
+
+    def request(self, method: str, url: str, timeout: float, params: dict | None = None) -> requests.Response:
+        key = next(iter((params or {}).values()), url)
+        with self.lock:
+            self.calls.append(key)
+            failures = self.failures.get(key)
+            status_code = failures.pop(0) if failures else 200
+        response = requests.Response()
+        response.url = url
+        response.status_code = status_code
+        if status_code == 429:
+            response.headers["Retry-After"] = "0"
+            body = {}
+        elif status_code == 404:
+            body = {"error": "Policy not found"}
+        elif status_code != 200:
+            body = {}
+        elif url.endswith("/policy-types"):
+            body = {"policyTypes": [f" {policy_type} " for policy_type in POLICY_NAMES]}
+        elif url.endswith("/names"):
+            body = {"policies": POLICY_NAMES[params["policyTypeName"]]}
+        else:
+            body = {"name": params["policyName"], "allowance": len(params["policyName"])}
+        response._content = json.dumps(body).encode()  # noqa: SLF001
+        return response
+
+
+def get_session(hibob: FakeHiBob) -> RateLimitedSession:
+    session = RateLimitedSession({}, main.MAX_WORKERS)
+    session.session = hibob
+    return session
+
+
+def test_policies_are_fetched_once_in_listing_order() -> None:
+    hibob = FakeHiBob()
+
+    policies = main.get_policies(get_session(hibob))
+
+    assert [policy["name"] for policy in policies] == [
+        "Standard holiday",
+        "Part time holiday",
+        "Retired holiday",
+        "Sickness",
+        "Maternity",
+        "Paternity",
+    ]
+    assert all(hibob.calls.count(policy["name"]) == 1 for policy in policies)
+
+
+def test_rate_limited_requests_are_retried() -> None:
+    hibob = FakeHiBob({"Sickness": [429], "Maternity": [429, 429]})
+
+    policies = main.get_policies(get_session(hibob))
+
+    assert len(policies) == 6
+    assert hibob.calls.count("Maternity") == 3
+
+
+def test_policies_hibob_reports_an_error_for_are_skipped() -> None:
+    hibob = FakeHiBob({"Retired holiday": [404]})
+
+    policies = main.get_policies(get_session(hibob))
+
+    assert "Retired holiday" not in [policy["name"] for policy in policies]
+
+
+def test_server_errors_are_raised() -> None:
+    hibob = FakeHiBob({"Parental": [503]})
+
+    with pytest.raises(requests.HTTPError):
+        main.get_policies(get_session(hibob))
@@ -1,15 +1,23 @@
 """Pipedrive Deals data pipeline."""
 
 import json
+from collections.abc import Iterator
+from datetime import datetime
 from os import getenv
 
 import pandas as pd
 from data_pipeline_tools.auth import pipedrive_access_token
-from data_pipeline_tools.util import flatten_columns, write_to_bigquery
+from data_pipeline_tools.util import flatten_columns, read_from_bigquery, write_to_bigquery
+from field_schema import get_field_schema
+from google.cloud import bigquery
+from paginator import paginate
 from pipedrive.client import Client
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 
+# The first hourly trigger of the day reloads every deal so deleted deals drop out of the table.
+FULL_RESYNC_HOUR = int(getenv("FULL_RESYNC_HOUR") or 6)
+
 UNNAMED_KEY_MIN_LENGTH = 30
 COLUMN_MAPPING = {
     "Source origin": "origin",
@@ -37,10 +45,130 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
         "table_name": getenv("TABLE_NAME"),
         "location": getenv("TABLE_LOCATION"),
         "service": service,
+        "sync_mode": getenv("SYNC_MODE") or "incremental",
     }
 
 
-def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013, C901
+def get_high_water_mark(config: dict[str, str]) -> str | None:
+    """Get the latest `update_time` already loaded into the deals table.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+
+    Returns:
+    -------
+        str | None: High-water mark in Pipedrive's `update_time` format, None if the table is empty or missing
+
+    """
+    query = f"""
+    SELECT CAST(MAX(update_time) AS STRING) AS high_water_mark
+    FROM `{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}`
+    """  # noqa: S608
+    try:
+        high_water_mark = read_from_bigquery(config["gcp_project"], query)["high_water_mark"].iloc[0]
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to read high-water mark: {e}")
+        return None
+    if pd.isna(high_water_mark):
+        return None
+    return pd.Timestamp(high_water_mark).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def is_full_sync(config: dict[str, str], high_water_mark: str | None) -> bool:
+    """Decide whether this run should reload the whole table.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        high_water_mark (str | None): Latest `update_time` already loaded
+
+    Returns:
+    -------
+        bool: True for a full WRITE_TRUNCATE reload, False for an incremental merge
+
+    """
+    return config["sync_mode"] != "incremental" or high_water_mark is None or datetime.now().hour == FULL_RESYNC_HOUR
+
+
+def get_changed_deals(client: Client, high_water_mark: str) -> Iterator[list[dict]]:
+    """Stream the deals updated since the high-water mark.
+
+    Deals are requested newest first, paging stops at the first deal older than the high-water mark.
+
+    Args:
+    ----
+        client (Client): Pipedrive client
+        high_water_mark (str): Latest `update_time` already loaded
+
+    Yields:
+    ------
+        list[dict]: Changed deals of each page
+
+    """
+    for page in paginate(lambda params: client.deals.get_all_deals(params={**params, "sort": "update_time DESC"})):
+        changed = [deal for deal in page if deal["update_time"] >= high_water_mark]
+        yield changed
+        if len(changed) < len(page):
+            return
+
+
+def get_deal_count(client: Client) -> int | None:
+    """Get the number of deals from the deals summary, so a full sync can request every page at once.
+
+    Args:
+    ----
+        client (Client): Pipedrive client
+
+    Returns:
+    -------
+        int | None: Number of deals, None if the summary is unavailable
+
+    """
+    try:
+        return client._get(f"{client.BASE_URL}deals/summary")["data"]["total_count"]  # noqa: SLF001
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to get deal count: {e}")
+        return None
+
+
+def merge_to_bigquery(config: dict[str, str], df: pd.DataFrame) -> None:
+    """Upsert deals into the deals table, keyed on `id`.
+
+    The changed rows are loaded into a staging table with the target's schema, which is then merged into the
+    target and dropped. Only columns the target already has are merged, new fields arrive with the next full sync.
+
+    Args:
+    ----
+        config (dict[str, str]): Config
+        df (pd.DataFrame): Changed deals
+
+    """
+    client = bigquery.Client(project=config["gcp_project"])
+    target = f"{config['gcp_project']}.{config['dataset_id']}.{config['table_name']}"
+    staging = f"{target}_staging"
+    schema = [field for field in client.get_table(target).schema if field.name in df]
+    dropped = sorted(set(df.columns) - {field.name for field in schema})
+    if dropped:
+        print(f"Not merging columns missing from {target}: {', '.join(dropped)}")
+    load_config = bigquery.LoadJobConfig(schema=schema, write_disposition="WRITE_TRUNCATE")
+    client.load_table_from_dataframe(df[[field.name for field in schema]], staging, job_config=load_config, location=config["location"]).result()
+
+    columns = [f"`{field.name}`" for field in schema]
+    merge_query = f"""
+    MERGE `{target}` T
+    USING `{staging}` S
+    ON T.id = S.id
+    WHEN MATCHED THEN
+      UPDATE SET {", ".join(f"{column} = S.{column}" for column in columns)}
+    WHEN NOT MATCHED THEN
+      INSERT ({", ".join(columns)}) VALUES ({", ".join(f"S.{column}" for column in columns)})
+    """  # noqa: S608
+    client.query(merge_query, location=config["location"]).result()
+    client.delete_table(staging, not_found_ok=True)
+
+
+def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013, C901, PLR0915
     """Run Pipedrive Deals data pipeline.
 
     Arguments are not used, but required by the Cloud Function framework.
@@ -65,17 +193,20 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     def get_column_name(item_name: str) -> str:
         return COLUMN_MAPPING.get(item_name, item_name.replace(" ", "_").lower())
 
-    def get_option_from_key(key: str, options: pd.DataFrame) -> str:
+    def get_option_from_key(key: str, labels: dict) -> str:
         if key is None:
             return None
         try:
             key_int = int(str(key))
         except (ValueError, TypeError):
+            if isinstance(key, str) and "," in key:
+                return ",".join(str(get_option_from_key(part.strip(), labels)) for part in key.split(","))
             return key
-        option = options[options["id"] == key_int]["label"].to_numpy()
-        if len(option) > 0:
-            return option[0]
-        return str(key_int)
+        return labels.get(key_int, str(key_int))
+
+    def map_options(column: pd.Series, labels: dict) -> pd.Series:
+        resolved = {key: get_option_from_key(key, labels) for key in column.dropna().unique()}
+        return column.map(resolved).where(column.notna(), column)
 
     service = "Data Pipeline - Pipedrive Deals"
     config = load_config(project_id, service)
@@ -83,41 +214,23 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     client = Client(domain="https://companydomain.pipedrive.com/")
     client.set_api_token(config["auth_token"])
 
-    done = False
-    deals = []
-    start = 0
-    while not done:
-        print(f"Getting deals from start: {start}")
-        deals_resp = client.deals.get_all_deals(params={"start": start})
-        if not deals_resp["success"]:
-            raise Exception("Error retrieving deals")
-        deals += deals_resp["data"]
-        if not deals_resp["additional_data"]["pagination"]["more_items_in_collection"]:
-            done = True
-        else:
-            start = deals_resp["additional_data"]["pagination"]["next_start"]
-
+    field_schema = get_field_schema(client.deals.get_deal_fields)
+    unnamed_columns = {key: name for key, name in field_schema["names"].items() if len(key) > UNNAMED_KEY_MIN_LENGTH}
+    unnamed_keys, unnamed_names = list(unnamed_columns), list(unnamed_columns.values())
+
+    high_water_mark = get_high_water_mark(config) if config["sync_mode"] == "incremental" else None
+    full_sync = is_full_sync(config, high_water_mark)
+    print("Running full sync" if full_sync else f"Running incremental sync from {high_water_mark}")
+    pages = paginate(client.deals.get_all_deals, total=get_deal_count(client)) if full_sync else get_changed_deals(client, high_water_mark)
+    updated_deals = [
+        update_keys(deal, unnamed_keys, unnamed_names)
+        for page in pages
+        for deal in page
+    ]
     print("Deals retrieved")
-
-    deal_fields_resp = (
-        client.deals.get_deal_fields()["data"]
-        + client.deals.get_deal_fields(params={"start": 100})["data"]
-        + client.deals.get_deal_fields(params={"start": 200})["data"]
-    )
-    column_names = pd.DataFrame(
-        [
-            {
-                "name": column["name"],
-                "key": column["key"],
-                "options": column.get("options"),
-            }
-            for column in deal_fields_resp
-        ],
-    )
-
-    unnamed_columns = column_names[column_names["key"].str.len() > UNNAMED_KEY_MIN_LENGTH]
-    optioned_columns = column_names[column_names["options"].notna()]
-    updated_deals = [update_keys(deal, unnamed_columns["key"].to_list(), unnamed_columns["name"].to_list()) for deal in deals]
+    if not updated_deals and not full_sync:
+        print("No changed deals")
+        return
     deals_df = pd.DataFrame(updated_deals).rename(columns=lambda x: str(x).replace(" ", "_").lower())
     nested_columns = [
         "creator_user_id",
@@ -125,27 +238,24 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
         "org_id",
         "person_id",
         "bid_manager",
-        
     ]
 
     flat_deals = flatten_columns(deals_df, nested_columns)
     print("Deals flattened")
-    
+
     if "person_id_email" not in flat_deals.columns and "person_id" in deals_df.columns:
         flat_deals["person_id_email"] = deals_df["person_id"].apply(
-            lambda v: (v.get("email")[0]["value"] if isinstance(v, dict) and v.get("email") else None)
-            
+            lambda v: (v.get("email")[0]["value"] if isinstance(v, dict) and v.get("email") else None),
         )
     if "person_id_phone" not in flat_deals.columns and "person_id" in deals_df.columns:
         flat_deals["person_id_phone"] = deals_df["person_id"].apply(
-            lambda v: (v.get("phone")[0]["value"] if isinstance(v, dict) and v.get("phone") else None)
+            lambda v: (v.get("phone")[0]["value"] if isinstance(v, dict) and v.get("phone") else None),
         )
         extracted_emails = flat_deals["person_id_email"].dropna().head(3).tolist()
 
-    for _, item in optioned_columns.iterrows():
-        name_col = get_column_name(item["name"])
-        key_col = item["key"]
-        options_df = pd.DataFrame(item["options"])
+    for key_col, labels in field_schema["labels"].items():
+        name = field_schema["names"][key_col]
+        name_col = get_column_name(name)
 
         target_col = None
         if name_col in flat_deals.columns:
@@ -153,12 +263,11 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
         elif key_col in flat_deals.columns:
             target_col = key_col
         else:
-            print(f"Warning: Option field missing. name='{item['name']}' key='{key_col}' looked for '{name_col}' or '{key_col}'")
+            print(f"Warning: Option field missing. name='{name}' key='{key_col}' looked for '{name_col}' or '{key_col}'")
             continue
 
-        flat_deals[target_col] = flat_deals[target_col].apply(lambda x: get_option_from_key(x, options_df))
+        flat_deals[target_col] = map_options(flat_deals[target_col], labels)
 
-        
         if target_col == key_col and name_col not in flat_deals.columns:
             flat_deals = flat_deals.rename(columns={key_col: name_col})
 
@@ -167,15 +276,18 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
             "bid_clarifications_due_by_time",
             "timezone_of_bid_clarifications_due_by_time",
             "timezone_of_bid/proposal_deadline_time",
-            "contracting_entity_(if_different_from_end_client)",  
+            "contracting_entity_(if_different_from_end_client)",
         ],
         errors="ignore",
     )
 
-    columns_to_drop = unnamed_columns["key"].to_list()
+    columns_to_drop = unnamed_keys
     flat_deals = flat_deals.drop(columns=columns_to_drop, errors="ignore")
 
-    write_to_bigquery(config, flat_deals, "WRITE_TRUNCATE")
+    if full_sync:
+        write_to_bigquery(config, flat_deals, "WRITE_TRUNCATE")
+    else:
+        merge_to_bigquery(config, flat_deals)
 
 
 if __name__ == "__main__":
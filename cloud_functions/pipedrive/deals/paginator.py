@@ -0,0 +1,108 @@
+"""Pipedrive collection pagination."""
+
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from pipedrive.exceptions import TooManyRequestsError
+
+PAGE_LIMIT = 500
+MAX_WORKERS = 4
+MAX_RETRIES = 5
+
+
+def get_retry_delay(error: TooManyRequestsError, attempt: int) -> float:
+    """Get how long to wait before retrying a rate limited request.
+
+    Args:
+    ----
+        error (TooManyRequestsError): Error raised for the 429 response
+        attempt (int): Number of attempts so far, used for backoff when Pipedrive gives no delay
+
+    Returns:
+    -------
+        float: Delay in seconds
+
+    """
+    headers = error.response.headers if error.response is not None else {}
+    return float(headers.get("Retry-After") or headers.get("x-ratelimit-reset") or 2**attempt)
+
+
+def get_page(fetch_page: Callable[..., dict], start: int, limit: int) -> dict:
+    """Get a single page of a Pipedrive collection, retrying when Pipedrive answers 429.
+
+    Args:
+    ----
+        fetch_page (Callable[..., dict]): Client method listing the collection, e.g. `client.deals.get_all_deals`
+        start (int): Offset of the page
+        limit (int): Page size
+
+    Returns:
+    -------
+        dict: Pipedrive response
+
+    """
+    for attempt in range(MAX_RETRIES):
+        print(f"Getting page from start: {start}")
+        try:
+            response = fetch_page(params={"start": start, "limit": limit})
+            break
+        except TooManyRequestsError as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            delay = get_retry_delay(e, attempt)
+            print(f"Rate limited on page from start: {start}, retrying in {delay}s")
+            time.sleep(delay)
+    if not response["success"]:
+        message = f"Error retrieving page from start: {start}"
+        raise Exception(message)
+    return response
+
+
+def paginate(
+    fetch_page: Callable[..., dict],
+    limit: int = PAGE_LIMIT,
+    total: int | None = None,
+    max_workers: int = MAX_WORKERS,
+) -> Iterator[list[dict]]:
+    """Stream the pages of a Pipedrive collection in order.
+
+    The next page is always requested while the caller processes the current one. When the total number of
+    items is known, the offsets up to it are requested ahead of the caller, with at most `max_workers` pages in
+    flight or waiting to be consumed.
+
+    Args:
+    ----
+        fetch_page (Callable[..., dict]): Client method listing the collection, e.g. `client.deals.get_all_deals`
+        limit (int): Page size, 500 is the maximum Pipedrive allows
+        total (int | None): Total number of items, if known
+        max_workers (int): Maximum number of requests in flight
+
+    Yields:
+    ------
+        list[dict]: Items of each page
+
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        start = 0
+        if total:
+            offsets = iter(range(0, total, limit))
+            pages = deque(executor.submit(get_page, fetch_page, offset, limit) for offset in islice(offsets, max_workers))
+            while pages:
+                response = pages.popleft().result()
+                for offset in islice(offsets, 1):
+                    pages.append(executor.submit(get_page, fetch_page, offset, limit))
+                yield response["data"] or []
+            pagination = response["additional_data"]["pagination"]
+            if not pagination["more_items_in_collection"]:
+                return
+            start = pagination["next_start"]
+
+        next_page = executor.submit(get_page, fetch_page, start, limit)
+        while next_page:
+            response = next_page.result()
+            pagination = response["additional_data"]["pagination"]
+            next_page = executor.submit(get_page, fetch_page, pagination["next_start"], limit) if pagination["more_items_in_collection"] else None
+            yield response["data"] or []
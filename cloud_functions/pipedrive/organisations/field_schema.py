@@ -0,0 +1,57 @@
+"""Pipedrive field schema."""
+
+import hashlib
+import json
+from collections.abc import Callable
+
+from paginator import paginate
+
+# Lookups compiled from the last schema seen by this instance, reused by warm invocations while the schema is unchanged.
+_compiled_schemas: dict[str, dict] = {}
+
+
+def compile_field_schema(fields: list[dict]) -> dict:
+    """Compile the lookups the pipelines need from a list of Pipedrive fields.
+
+    Args:
+    ----
+        fields (list[dict]): Pipedrive fields
+
+    Returns:
+    -------
+        dict: Field names by key, and option labels by option id for every field with options
+
+    """
+    labels = {}
+    for field in fields:
+        if field.get("options") is not None:
+            field_labels = labels[field["key"]] = {}
+            for option in field["options"]:
+                field_labels.setdefault(option["id"], option["label"])
+    return {
+        "names": {field["key"]: field["name"] for field in fields},
+        "labels": labels,
+    }
+
+
+def get_field_schema(fetch_fields: Callable[..., dict]) -> dict:
+    """Get the complete field schema of a Pipedrive entity.
+
+    Every page of fields is fetched. The lookups are only recompiled when the schema hash changes.
+
+    Args:
+    ----
+        fetch_fields (Callable[..., dict]): Client method listing the fields, e.g. `client.deals.get_deal_fields`
+
+    Returns:
+    -------
+        dict: Compiled field schema, see `compile_field_schema`
+
+    """
+    fields = [field for page in paginate(fetch_fields) for field in page]
+    schema_hash = hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+    if schema_hash not in _compiled_schemas:
+        print(f"Compiling field schema {schema_hash[:12]} ({len(fields)} fields)")
+        _compiled_schemas.clear()
+        _compiled_schemas[schema_hash] = compile_field_schema(fields)
+    return _compiled_schemas[schema_hash]
@@ -5,6 +5,8 @@ from os import getenv
 import pandas as pd
 from data_pipeline_tools.auth import pipedrive_access_token
 from data_pipeline_tools.util import write_to_bigquery
+from field_schema import get_field_schema
+from paginator import paginate
 from pipedrive.client import Client
 
 project_id = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
@@ -33,7 +35,7 @@ def load_config(project_id: str, service: str) -> dict[str, str]:
     }
 
 
-def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013, C901
+def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Run Pipedrive Organisations data pipeline.
 
     Arguments are not used, but required by the Cloud Function framework.
@@ -45,21 +47,24 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
 
     """
 
-    def get_option_from_key(key: str, options: pd.DataFrame) -> str:
+    def get_option_from_key(key: str, labels: dict) -> str:
         if isinstance(key, str) and key.isnumeric():
-            option = options[options["id"] == int(key)]["label"]
-            if len(option) > 0:
-                return option.to_numpy()[0]
+            if int(key) in labels:
+                return labels[int(key)]
             if len(key) > 0:
                 return f"{key} Not Found ?!?"
         return key
 
-    def update_keys(dict_list: list[dict], keys_to_update: list[str], new_keys: list[str]) -> list[dict]:
-        for dictionary in dict_list:
-            for old_key, new_key in zip(keys_to_update, new_keys, strict=True):
-                if old_key in dictionary:
-                    dictionary[new_key.replace(" ", " ").lower()] = dictionary.pop(old_key)
-        return dict_list
+    def map_options(column: pd.Series, labels: dict) -> pd.Series:
+        resolved = {key: get_option_from_key(key, labels) for key in column.dropna().unique()}
+        return column.map(resolved).where(column.notna(), column)
+
+    def update_keys(df: pd.DataFrame, keys_to_update: list[str], new_keys: list[str]) -> pd.DataFrame:
+        columns = dict(df.items())
+        for old_key, new_key in zip(keys_to_update, new_keys, strict=True):
+            if old_key in columns:
+                columns[new_key.lower()] = columns.pop(old_key)
+        return pd.DataFrame(columns, index=df.index)
 
     service = "Data Pipeline - Pipedrive Organisations"
     config = load_config(project_id, service)
@@ -69,48 +74,21 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
     client.set_api_token(config["auth_token"])
     print("Pipedrive client created")
 
-    done = False
-    organisations = []
-    start = 0  # 0 is the first deal
-    while not done:
-        print(f"Getting organisations from start: {start}")
-        organisations_resp = client.organizations.get_all_organizations(params={"start": start})
-        if not organisations_resp["success"]:
-            raise Exception("Error retrieving organisations")
-        organisations += organisations_resp["data"]
-        if not organisations_resp["additional_data"]["pagination"]["more_items_in_collection"]:
-            done = True
-        else:
-            start = organisations_resp["additional_data"]["pagination"]["next_start"]
-
+    organisations = [organisation for page in paginate(client.organizations.get_all_organizations) for organisation in page]
     print("organisations retrieved")
 
-    org_fields_resp = client.organizations.get_organization_fields()
-    if not org_fields_resp["success"]:
-        raise Exception("unsuccessful")
-    org_fields = pd.DataFrame(
-        [
-            {
-                "name": c["name"],
-                "key": c["key"],
-                "options": c.get("options"),
-            }
-            for c in org_fields_resp["data"]
-        ],
-    )
-
-    optioned_columns = org_fields[org_fields["options"].notna()]
-    orgs_df = pd.DataFrame(update_keys(organisations, org_fields["key"], org_fields["name"])).rename(
+    field_schema = get_field_schema(client.organizations.get_organization_fields)
+    orgs_df = update_keys(pd.DataFrame(organisations), list(field_schema["names"]), list(field_schema["names"].values())).rename(
         columns=lambda x: x.replace(
             " ",
             "_",
         ).lower(),
     )
-    for _, item in optioned_columns.iterrows():
-        print(item["name"])
-        orgs_df[item["name"].replace(" ", "_").lower()] = orgs_df[item["name"].replace(" ", "_").lower()].apply(
-            lambda x: get_option_from_key(x, pd.DataFrame(item["options"])),  # noqa: B023
-        )
+    for key, labels in field_schema["labels"].items():
+        name = field_schema["names"][key]
+        print(name)
+        column = name.replace(" ", "_").lower()
+        orgs_df[column] = map_options(orgs_df[column], labels)
 
     columns_to_drop = []
     orgs_df = orgs_df.drop(columns=columns_to_drop, errors="ignore")
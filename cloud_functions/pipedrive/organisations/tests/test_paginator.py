@@ -0,0 +1,91 @@
+"""Tests for paginating Pipedrive collections."""
+
+import threading
+import time
+
+import paginator
+import pytest
+import requests
+from pipedrive.exceptions import TooManyRequestsError
+
+LIMIT = 10
+
+
+class FakeCollection:
+    """Pipedrive collection listing numbered items, optionally rate limiting the first requests for some offsets."""
+
+    def __init__(self, size: int, throttled: dict[int, int] | None = None, headers: dict[str, str] | None = None) -> None:
+        self.size = size
+        self.throttled = throttled or {}
+        self.headers = headers or {}
+        self.calls: list[int] = []
+        self.lock = threading.Lock()
+
+    def fetch_page(self, params: dict) -> dict:
+        start, limit = params["start"], params["limit"]
+        with self.lock:
+            self.calls.append(start)
+            if self.throttled.get(start):
+                self.throttled[start] -= 1
+                response = requests.Response()
+                response.status_code = 429
+                response.headers.update(self.headers)
+                raise TooManyRequestsError("Too Many Requests", response)
+        end = min(start + limit, self.size)
+        return {
+            "success": True,
+            "data": list(range(start, end)) or None,
+            "additional_data": {"pagination": {"more_items_in_collection": end < self.size, "next_start": end}},
+        }
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    delays = []
+    monkeypatch.setattr(paginator.time, "sleep", delays.append)
+    return delays
+
+
+@pytest.mark.parametrize("total", [None, 45])
+def test_pages_are_yielded_in_order(total: int | None) -> None:
+    collection = FakeCollection(45)
+
+    pages = list(paginator.paginate(collection.fetch_page, limit=LIMIT, total=total))
+
+    assert [item for page in pages for item in page] == list(range(45))
+
+
+def test_lookahead_is_bounded_by_max_workers() -> None:
+    collection = FakeCollection(100)
+    pages = paginator.paginate(collection.fetch_page, limit=LIMIT, total=100, max_workers=2)
+
+    next(pages)
+    time.sleep(0.1)
+
+    assert sorted(collection.calls) == [0, 10, 20]
+    assert sum(len(page) for page in pages) == 90
+
+
+def test_rate_limited_page_is_retried_after_retry_after(sleeps: list[float]) -> None:
+    collection = FakeCollection(45, throttled={20: 1}, headers={"Retry-After": "7"})
+
+    pages = list(paginator.paginate(collection.fetch_page, limit=LIMIT, total=45))
+
+    assert [item for page in pages for item in page] == list(range(45))
+    assert collection.calls.count(20) == 2
+    assert sleeps == [7.0]
+
+
+def test_rate_limit_reset_is_used_without_retry_after(sleeps: list[float]) -> None:
+    collection = FakeCollection(5, throttled={0: 1}, headers={"x-ratelimit-reset": "2"})
+
+    assert list(paginator.paginate(collection.fetch_page, limit=LIMIT)) == [[0, 1, 2, 3, 4]]
+    assert sleeps == [2.0]
+
+
+def test_rate_limit_is_raised_after_max_retries(sleeps: list[float]) -> None:
+    collection = FakeCollection(5, throttled={0: paginator.MAX_RETRIES})
+
+    with pytest.raises(TooManyRequestsError):
+        list(paginator.paginate(collection.fetch_page, limit=LIMIT))
+    assert sleeps == [2**attempt for attempt in range(paginator.MAX_RETRIES - 1)]
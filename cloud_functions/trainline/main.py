@@ -2,12 +2,16 @@
 """Process Trainline expense reports and upload them to Harvest."""
 
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from csv import DictWriter
-from datetime import date, datetime, timedelta
+from datetime import UTC, date, datetime, timedelta
 from os import getenv
 from pathlib import Path
 
 import httpx
+import numpy as np
 import pandas as pd
 from constants import (
     FUZZ_CONFIDENCE,
@@ -23,18 +27,35 @@ from constants import (
 from data_pipeline_tools.auth import access_secret_version, harvest_headers
 from data_pipeline_tools.drive import GoogleDriveService
 from data_pipeline_tools.util import read_from_bigquery, write_to_bigquery
-from thefuzz import process
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from matching import AssignmentIndex, ProjectMatcher
+from snapshot_cache import read_from_bigquery_cached
 
 SERVICE = "Data Pipeline - Trainline"
 PROJECT_ID = getenv("GOOGLE_CLOUD_PROJECT") or "tpx-consulting-dashboards"
 PROCESSING_DATE = date.today() - timedelta(days=2)
 SLACK_WEBHOOK_URL = access_secret_version(PROJECT_ID, "SLACK_WEBHOOK_URL")
+MAX_WORKERS = int(getenv("TRAINLINE_MAX_WORKERS") or 8)
+MAX_RETRIES = 5
+LEDGER_SCHEMA = [
+    bigquery.SchemaField("booking", "STRING"),
+    bigquery.SchemaField("user_id", "INTEGER"),
+    bigquery.SchemaField("amount", "STRING"),
+    bigquery.SchemaField("spent_date", "STRING"),
+    bigquery.SchemaField("expense_id", "INTEGER"),
+    bigquery.SchemaField("posted_at", "TIMESTAMP"),
+]
 
 
 class ProjectError(Exception):
     """Exception raised for errors while trying to retrieve the project."""
 
 
+class LedgerError(Exception):
+    """Exception raised when a posted expense cannot be recorded in the ledger."""
+
+
 def send_slack_notification(message: str) -> None:
     """Send a notification to Slack using the configured webhook URL.
 
@@ -68,7 +89,7 @@ def get_tpx_query_data(project_id: str, query: str) -> pd.DataFrame:
         pd.DataFrame: Query results with processed date columns
 
     """
-    tpx_df = read_from_bigquery(project_id=project_id, query=query)
+    tpx_df = read_from_bigquery_cached(project_id=project_id, query=query)
     tpx_df["start_date"] = pd.to_datetime(tpx_df["start_date"], errors="coerce")
     tpx_df["end_date"] = pd.to_datetime(tpx_df["end_date"], errors="coerce")
     return tpx_df
@@ -137,14 +158,88 @@ def load_config() -> dict[str:str]:
     }
 
 
-def get_project_data(tpx_df: pd.DataFrame, row: pd.Series, name_filter: pd.Series) -> tuple[str, str]:
+def get_fuzzy_cache_config(config: dict[str:str]) -> dict[str:str]:
+    """Get the config of the table caching fuzzy project match scores.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+
+    Returns:
+    -------
+        dict[str:str]: Cache table config
+
+    """
+    return {**config, "table_name": f"{config['table_name']}_fuzzy_scores"}
+
+
+def load_fuzzy_cache(config: dict[str:str]) -> dict[tuple[str, str], float]:
+    """Load the fuzzy project match scores of previous runs.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+
+    Returns:
+    -------
+        dict[tuple[str, str], float]: Score by normalised answer and project, empty if the cache table does not exist yet
+
+    """
+    cache_config = get_fuzzy_cache_config(config)
+    query = f"""
+    SELECT answer, project_client_name, score
+    FROM `{cache_config['gcp_project']}.{cache_config['dataset_id']}.{cache_config['table_name']}`
+    """  # noqa: S608
+    try:
+        cache_df = read_from_bigquery(project_id=cache_config["gcp_project"], query=query)
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to load fuzzy match cache: {e}")
+        return {}
+    return dict(zip(zip(cache_df["answer"], cache_df["project_client_name"], strict=True), cache_df["score"], strict=True))
+
+
+def save_fuzzy_cache(config: dict[str:str], scores: dict[tuple[str, str], float]) -> None:
+    """Add newly computed fuzzy project match scores to the cache table.
+
+    Scores are staged and merged on answer and project, so runs that score the same pair only store it once.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+        scores (dict[tuple[str, str], float]): Score by normalised answer and project
+
+    """
+    if not scores:
+        return
+    cache_config = get_fuzzy_cache_config(config)
+    staging_config = {**cache_config, "table_name": f"{cache_config['table_name']}_staging"}
+    cache_df = pd.DataFrame([{"answer": answer, "project_client_name": project, "score": score} for (answer, project), score in scores.items()])
+    write_to_bigquery(staging_config, cache_df, "WRITE_TRUNCATE")
+
+    target = f"{cache_config['gcp_project']}.{cache_config['dataset_id']}.{cache_config['table_name']}"
+    staging = f"{staging_config['gcp_project']}.{staging_config['dataset_id']}.{staging_config['table_name']}"
+    merge_query = f"""
+    CREATE TABLE IF NOT EXISTS `{target}` LIKE `{staging}`;
+    MERGE `{target}` T
+    USING `{staging}` S
+    ON T.answer = S.answer AND T.project_client_name = S.project_client_name
+    WHEN NOT MATCHED THEN
+      INSERT (answer, project_client_name, score) VALUES (S.answer, S.project_client_name, S.score);
+    """  # noqa: S608
+    client = bigquery.Client(project=cache_config["gcp_project"])
+    client.query(merge_query, location=cache_config["location"]).result()
+    client.delete_table(staging, not_found_ok=True)
+
+
+def get_project_data(assignments: AssignmentIndex, matcher: ProjectMatcher, emails: list[str], row: pd.Series) -> tuple[str, str]:
     """Get billable data for a given row.
 
     Args:
     ----
-        tpx_df (pd.DataFrame): Query results
+        assignments (AssignmentIndex): Indexed query results
+        matcher (ProjectMatcher): Project matcher for the `Answer2` free text
+        emails (list[str]): Emails matching the booker name
         row (pd.Series): Input row
-        name_filter (pd.Series): Name filter
 
     Returns:
     -------
@@ -152,25 +247,23 @@ def get_project_data(tpx_df: pd.DataFrame, row: pd.Series, name_filter: pd.Serie
 
     """
     journey_date = row["OutwardLegDate"]
-    billable_df = tpx_df[~tpx_df["client_name"].str.contains("TPX")]
 
     # Filter for exact date
-    date_filter = (billable_df["start_date"] == journey_date) & (billable_df["end_date"] == journey_date)
-    filtered_df = billable_df.loc[name_filter & date_filter]
+    journey_day = np.datetime64(journey_date, "D")
+    filtered_df = assignments.get_billable_assignments(emails, journey_day, journey_day)
 
     # No match for exact date
     if filtered_df.empty:
         monday, friday = find_monday_friday(journey_date)
-        week_filter = (billable_df["start_date"] >= monday) & (billable_df["end_date"] <= friday)
-        filtered_df = billable_df.loc[name_filter & week_filter]
+        filtered_df = assignments.get_billable_assignments(emails, np.datetime64(monday), np.datetime64(friday))
 
         if filtered_df.empty:
             raise ProjectError("no project assigned")
 
     # Multiple project assignments
     if filtered_df.shape[0] > 1:
-        project_list = filtered_df["project_client_name"].unique()
-        closest_match = process.extractOne(row["Answer2"], project_list)
+        project_list = filtered_df["project_client_name"].unique().tolist()
+        closest_match = matcher.match(row["Answer2"], project_list)
 
         if closest_match[1] > FUZZ_CONFIDENCE:
             filtered_df = filtered_df[filtered_df["project_client_name"] == closest_match[0]]
@@ -207,23 +300,21 @@ def get_team_data(person: pd.Series) -> tuple[str, str, str]:
 
 
 def process_expense(
-    config: dict[str, str],
-    tpx_df: pd.DataFrame,
-    assignment_df: pd.DataFrame,
+    assignments: AssignmentIndex,
+    matcher: ProjectMatcher,
     row: pd.Series,
-) -> dict[str:str]:
-    """Process an expense row from the Trainline report.
+) -> tuple[dict[str:str], dict | None]:
+    """Resolve the Harvest user and project of an expense row from the Trainline report.
 
     Args:
     ----
-        config (dict[str, str]): Configuration dictionary
-        tpx_df (pd.DataFrame): TPX query results
-        assignment_df (pd.DataFrame): Assignment query results
+        assignments (AssignmentIndex): Indexed TPX query results
+        matcher (ProjectMatcher): Project matcher for the `Answer2` free text
         row (pd.Series): Input row
 
     Returns:
     -------
-        dict[str:str]: Expense data
+        tuple[dict[str:str], dict | None]: Result row, and the expense to post or None if it cannot be posted
 
     """
     billable = row["Answer3"] == TRAINLINE_BILLABLE_ANSWER
@@ -241,81 +332,101 @@ def process_expense(
         "Billable": billable,
     }
 
-    # Use vectorized string matching to filter email
-    name_filter = tpx_df["email"].apply(lambda x: x and all(name.lower() in str(x).lower() for name in row["BookerName"].strip().lower().split()))
+    emails = assignments.match_emails(row["BookerName"])
 
-    if not name_filter.any():
+    if not emails:
         result["Notes"] = f"no match for '{row['BookerName']}' on forecast"
-        return result
+        return result, None
 
-    result["First Name"] = tpx_df[name_filter].iloc[0]["first_name"]
-    result["Last Name"] = tpx_df[name_filter].iloc[0]["last_name"]
+    person = assignments.get_person(emails)
+    result["First Name"] = person["first_name"]
+    result["Last Name"] = person["last_name"]
 
     try:
         if internal:
-            user_id, project_id, team_name = get_team_data(tpx_df[name_filter].iloc[0])
+            user_id, project_id, team_name = get_team_data(person)
         else:
-            user_id, project_id = get_project_data(tpx_df[name_filter], row, name_filter)
+            user_id, project_id = get_project_data(assignments, matcher, emails, row)
     except ProjectError as e:
         print(f"Error processing row of {result['First Name']} {result['Last Name']}: {e}")
         result["Notes"] = str(e)
-        return result
+        return result, None
 
     if user_id and project_id:
-        result["Client"] = "TPXimpact" if internal else tpx_df[tpx_df["project_id"] == project_id]["client_name"].iloc[0]
-        result["Project"] = team_name if internal else tpx_df[tpx_df["project_id"] == project_id]["project_name"].iloc[0]
+        result["Client"] = "TPXimpact" if internal else assignments.get_project(project_id)["client_name"]
+        result["Project"] = team_name if internal else assignments.get_project(project_id)["project_name"]
+        expense = {
+            "booking": row["Booking"],
+            "user_id": user_id,
+            "project_id": project_id,
+            "total_cost": row["TotalCost"],
+            "billable": billable,
+            "internal": internal,
+        }
+        return result, expense
+    result["Notes"] = "unable to retrieve project id"
+    return result, None
+
+
+def post_with_retries(client: httpx.Client, url: str, payload: dict) -> httpx.Response:
+    """Post to Harvest, waiting out rate limits.
+
+    Only requests Harvest has certainly not processed are retried: 429 responses, after their `Retry-After`
+    delay, and connections that could not be opened.
+
+    Args:
+    ----
+        client (httpx.Client): Harvest client
+        url (str): URL to post to
+        payload (dict): JSON body
+
+    Returns:
+    -------
+        httpx.Response: Response to the last attempt
+
+    """
+    for attempt in range(MAX_RETRIES):
         try:
-            if internal:
-                assignment_df = assignment_df[(assignment_df["user_id"] == user_id) & (assignment_df["project_id"] == project_id)]
-                if assignment_df.empty:
-                    try:
-                        assign_harvest_project_to_user(config, user_id, project_id)
-                    except:  # noqa: E722
-                        result["Notes"] = "unable to assign TPX team project"
-                        return result
-            print(f"Posting £{row['TotalCost']} for {result['First Name']} {result['Last Name']} on {result['Client']} - {result['Project']}")
-            post_expense(config, user_id, project_id, row["TotalCost"], billable)
-        except Exception as e:  # noqa: BLE001
-            result["Notes"] = str(e)
-    else:
-        result["Notes"] = "unable to retrieve project id"
-    return result
-
-
-def post_expense(
-    config: dict[str:str],
-    user_id: str,
-    project_id: str,
-    total_cost: float,
-    billable: bool,  # noqa: FBT001
-) -> dict[str:str]:
+            response = client.post(url, json=payload)
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            print(f"Retrying {url} in {2**attempt}s: {e}")
+            time.sleep(2**attempt)
+            continue
+        if response.status_code != httpx.codes.TOO_MANY_REQUESTS or attempt == MAX_RETRIES - 1:
+            return response
+        delay = float(response.headers.get("Retry-After") or 2**attempt)
+        print(f"Rate limited by Harvest, retrying {url} in {delay}s")
+        time.sleep(delay)
+    return response
+
+
+def post_expense(client: httpx.Client, config: dict[str:str], expense: dict) -> dict[str:str]:
     """Post an expense to Harvest.
 
     Args:
     ----
+        client (httpx.Client): Harvest client
         config (dict[str:str]): Configuration dictionary
-        user_id (str): User ID
-        project_id (str): Project ID
-        travel_date (datetime.date): Travel date
-        total_cost (float): Total cost
-        billable (bool): Is billable
+        expense (dict): Resolved expense, with its user ID, project ID, total cost and billable flag
 
     Returns:
     -------
         dict[str:str]: Response data
 
     """
-    response = httpx.post(
+    response = post_with_retries(
+        client,
         f"{config['base_url']}{config['expense_endpoint']}",
-        headers=config["headers"],
-        json={
+        {
             "expense_category_id": str(TRAINLINE_EXPENSE_CATEGORY["id"]),
-            "user_id": str(int(user_id)),
-            "project_id": str(int(project_id)),
+            "user_id": str(int(expense["user_id"])),
+            "project_id": str(int(expense["project_id"])),
             "spent_date": PROCESSING_DATE.strftime("%Y-%m-%d"),
-            "total_cost": str(total_cost),
+            "total_cost": str(expense["total_cost"]),
             "notes": "Trainline Business Account - do not reimburse",
-            "billable": billable,
+            "billable": expense["billable"],
         },
     )
 
@@ -325,6 +436,191 @@ def post_expense(
     return response.json()
 
 
+def get_ledger_config(config: dict[str:str]) -> dict[str:str]:
+    """Get the config of the table recording every expense posted to Harvest.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+
+    Returns:
+    -------
+        dict[str:str]: Ledger table config
+
+    """
+    return {**config, "table_name": f"{config['table_name']}_ledger"}
+
+
+def get_ledger_table(config: dict[str:str]) -> str:
+    """Get the ID of the table recording every expense posted to Harvest.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+
+    Returns:
+    -------
+        str: Ledger table ID
+
+    """
+    ledger_config = get_ledger_config(config)
+    return f"{ledger_config['gcp_project']}.{ledger_config['dataset_id']}.{ledger_config['table_name']}"
+
+
+def get_ledger_key(booking: str, user_id: int, total_cost: float) -> tuple[str, int, str, str]:
+    """Get the key identifying a posted expense in the ledger.
+
+    Args:
+    ----
+        booking (str): Booking key from `get_booking_keys`
+        user_id (int): Harvest user ID
+        total_cost (float): Total cost
+
+    Returns:
+    -------
+        tuple[str, int, str, str]: Booking, user ID, amount and spent date
+
+    """
+    return booking, int(user_id), str(total_cost), PROCESSING_DATE.strftime("%Y-%m-%d")
+
+
+def load_ledger(config: dict[str:str]) -> set[tuple[str, int, str, str]]:
+    """Load the keys of the expenses already posted for PROCESSING_DATE.
+
+    Any error other than the ledger table not existing yet is raised, so nothing is posted without the ledger.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+
+    Returns:
+    -------
+        set[tuple[str, int, str, str]]: Ledger keys, empty if the ledger table does not exist yet
+
+    """
+    table_id = get_ledger_table(config)
+    try:
+        bigquery.Client(project=config["gcp_project"]).get_table(table_id)
+    except NotFound:
+        print(f"No expense ledger at {table_id} yet")
+        return set()
+    query = f"""
+    SELECT booking, user_id, amount, spent_date
+    FROM `{table_id}`
+    WHERE spent_date = "{PROCESSING_DATE.strftime('%Y-%m-%d')}"
+    """  # noqa: S608
+    ledger_df = read_from_bigquery(project_id=config["gcp_project"], query=query)
+    return {(row["booking"], int(row["user_id"]), row["amount"], row["spent_date"]) for row in ledger_df.to_dict("records")}
+
+
+def record_ledger_entry(client: bigquery.Client, table_id: str, entry: dict) -> None:
+    """Stream a posted expense into the ledger.
+
+    Streaming inserts are not load jobs, so they are not limited to a few table updates per second. A table
+    created moments before may not accept them yet, so inserts into a missing table are retried.
+
+    Args:
+    ----
+        client (bigquery.Client): BigQuery client
+        table_id (str): Ledger table ID
+        entry (dict): Ledger row
+
+    """
+    row_id = "|".join(str(entry[field]) for field in ("booking", "user_id", "amount", "spent_date"))
+    for attempt in range(MAX_RETRIES):
+        try:
+            errors = client.insert_rows_json(table_id, [entry], row_ids=[row_id])
+            break
+        except NotFound:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2**attempt)
+    if errors:
+        message = f"Unable to record expense {entry['expense_id']} in the ledger: {errors}"
+        raise LedgerError(message)
+
+
+def get_booking_keys(trainline_df: pd.DataFrame) -> pd.Series:
+    """Get a key for each booking in the report, stable across reruns of the same report.
+
+    Identical bookings are told apart by their occurrence number.
+
+    Args:
+    ----
+        trainline_df (pd.DataFrame): Trainline data
+
+    Returns:
+    -------
+        pd.Series: Booking keys
+
+    """
+    occurrence = trainline_df.groupby(["BookerName", "OutwardLegDate", "TotalCost"], dropna=False).cumcount()
+    return trainline_df["BookerName"] + "|" + trainline_df["OutwardLegDate"].astype(str) + "|" + occurrence.astype(str)
+
+
+def post_expenses(client: httpx.Client, config: dict[str:str], expenses: list[tuple[dict, dict]], ledger: set[tuple]) -> None:
+    """Post resolved expenses to Harvest concurrently, skipping any already in the ledger.
+
+    Each expense is streamed into the ledger as soon as Harvest accepts it, so a run that stops part way
+    through never posts it again. If the ledger cannot be written, no further expenses are posted, Slack is
+    told which posted expenses are missing from the ledger and the error is raised.
+    Failures to post are recorded in the Notes of the expense's result row.
+
+    Args:
+    ----
+        client (httpx.Client): Harvest client
+        config (dict[str:str]): Configuration dictionary
+        expenses (list[tuple[dict, dict]]): Result rows and the expenses resolved for them
+        ledger (set[tuple]): Keys of the expenses already posted
+
+    """
+    table_id = get_ledger_table(config)
+    bq_client = bigquery.Client(project=config["gcp_project"])
+    bq_client.create_table(bigquery.Table(table_id, schema=LEDGER_SCHEMA), exists_ok=True)
+    stop = threading.Event()
+    unrecorded = []
+    errors = []
+
+    def post(result: dict, expense: dict) -> None:
+        key = get_ledger_key(expense["booking"], expense["user_id"], expense["total_cost"])
+        booking, user_id, amount, spent_date = key
+        if key in ledger:
+            print(f"Skipping {booking}, already posted")
+            result["Notes"] = "already posted"
+            return
+        if stop.is_set():
+            result["Notes"] = "not posted, unable to write expense ledger"
+            return
+        print(f"Posting £{amount} for {result['First Name']} {result['Last Name']} on {result['Client']} - {result['Project']}")
+        try:
+            response = post_expense(client, config, expense)
+        except Exception as e:  # noqa: BLE001
+            result["Notes"] = str(e)
+            return
+        entry = {
+            "booking": booking,
+            "user_id": user_id,
+            "amount": amount,
+            "spent_date": spent_date,
+            "expense_id": response["id"],
+            "posted_at": datetime.now(UTC).isoformat(),
+        }
+        try:
+            record_ledger_entry(bq_client, table_id, entry)
+        except Exception as e:  # noqa: BLE001
+            stop.set()
+            unrecorded.append(entry["expense_id"])
+            errors.append(e)
+
+    with ThreadPoolExecutor(MAX_WORKERS) as executor:
+        list(executor.map(lambda pending: post(*pending), expenses))
+
+    if errors:
+        expense_ids = ", ".join(str(expense_id) for expense_id in unrecorded)
+        send_slack_notification(f"Unable to write Trainline expense ledger, expenses {expense_ids} are posted but not recorded: {errors[0]}")
+        raise errors[0]
+
+
 def get_trainline_data(path: Path) -> pd.DataFrame:
     """Get Trainline data from a CSV file.
 
@@ -395,12 +691,12 @@ def get_trainline_report(gdrive: GoogleDriveService, folder_name: str) -> tuple[
     return None, None
 
 
-def assign_harvest_project_to_user(config: dict, user_id: int, project_id: int) -> None:
+def assign_harvest_project_to_user(client: httpx.Client, user_id: int, project_id: int) -> None:
     """Assign a project to a user on Harvest.
 
     Args:
     ----
-        config (dict): The configuration settings.
+        client (httpx.Client): Harvest client
         user_id (int): The ID of the user.
         project_id (int): The ID of the project.
 
@@ -409,15 +705,89 @@ def assign_harvest_project_to_user(config: dict, user_id: int, project_id: int)
         None
 
     """
-    resp = httpx.post(
+    resp = post_with_retries(
+        client,
         f"https://api.harvestapp.com/v2/projects/{project_id!s}/user_assignments",
-        headers=config["headers"],
-        json={"user_id": str(user_id)},
+        {"user_id": str(user_id)},
     )
     if resp.status_code != httpx.codes.CREATED:
         resp.raise_for_status()
 
 
+def assign_missing_projects(client: httpx.Client, assigned: set[tuple[int, int]], pairs: set[tuple[int, int]]) -> set[tuple[int, int]]:
+    """Assign users to the projects they are missing on Harvest, concurrently.
+
+    Args:
+    ----
+        client (httpx.Client): Harvest client
+        assigned (set[tuple[int, int]]): Known user and project assignments, updated with the ones created
+        pairs (set[tuple[int, int]]): User and project assignments needed
+
+    Returns:
+    -------
+        set[tuple[int, int]]: Assignments that could not be created
+
+    """
+
+    def assign(pair: tuple[int, int]) -> bool:
+        try:
+            assign_harvest_project_to_user(client, *pair)
+        except Exception as e:  # noqa: BLE001
+            print(f"Unable to assign user {pair[0]} to project {pair[1]}: {e}")
+            return False
+        return True
+
+    missing = sorted(pairs - assigned)
+    print(f"Assigning {len(missing)} missing team projects")
+    with ThreadPoolExecutor(MAX_WORKERS) as executor:
+        created = dict(zip(missing, executor.map(assign, missing), strict=True))
+    assigned.update(pair for pair, ok in created.items() if ok)
+    return {pair for pair, ok in created.items() if not ok}
+
+
+def process_report(config: dict[str:str], trainline_df: pd.DataFrame) -> list[dict[str:str]]:
+    """Resolve every booking of a report, then create missing team project assignments and post the expenses.
+
+    Args:
+    ----
+        config (dict[str:str]): Configuration dictionary
+        trainline_df (pd.DataFrame): Trainline data
+
+    Returns:
+    -------
+        list[dict[str:str]]: Result rows
+
+    """
+    assignments = AssignmentIndex(get_tpx_query_data(PROJECT_ID, TPX_DATA_QUERY))
+    assignment_df = read_from_bigquery_cached(project_id=PROJECT_ID, query=HARVEST_ASSIGNMENT_QUERY)
+    matcher = ProjectMatcher(load_fuzzy_cache(config))
+    matcher.score(
+        (row["Answer2"], project)
+        for _, row in trainline_df.iterrows()
+        for project in assignments.get_billable_projects(assignments.match_emails(row["BookerName"]))
+    )
+    trainline_df["Booking"] = get_booking_keys(trainline_df)
+    resolved = [process_expense(assignments, matcher, row) for _, row in trainline_df.iterrows()]
+    save_fuzzy_cache(config, matcher.new_scores)
+
+    with httpx.Client(headers=config["headers"], timeout=30, limits=httpx.Limits(max_connections=MAX_WORKERS)) as client:
+        assigned = set(zip(assignment_df["user_id"], assignment_df["project_id"], strict=True))
+        team_projects = {(expense["user_id"], expense["project_id"]) for _, expense in resolved if expense and expense["internal"]}
+        unassigned = assign_missing_projects(client, assigned, team_projects)
+
+        expenses = []
+        for result, expense in resolved:
+            if not expense:
+                continue
+            if expense["internal"] and (expense["user_id"], expense["project_id"]) in unassigned:
+                result["Notes"] = "unable to assign TPX team project"
+                continue
+            expenses.append((result, expense))
+        post_expenses(client, config, expenses, load_ledger(config))
+
+    return [result for result, _ in resolved]
+
+
 def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF013
     """Process the Trainline report.
 
@@ -443,9 +813,7 @@ def main(data: dict = None, context: dict = None) -> None:  # noqa: ARG001, RUF0
                 trainline_df = get_trainline_data(report_path)
                 trainline_df.to_csv(Path(f"trainline_{PROCESSING_DATE}.csv"), index=False)
                 if not trainline_df.empty:
-                    tpx_df = get_tpx_query_data(PROJECT_ID, TPX_DATA_QUERY)
-                    assignment_df = read_from_bigquery(project_id=PROJECT_ID, query=HARVEST_ASSIGNMENT_QUERY)
-                    results = [process_expense(config, tpx_df, assignment_df, row) for _, row in trainline_df.iterrows()]
+                    results = process_report(config, trainline_df)
         except Exception as e:  # noqa: BLE001
             print(e)
         report_path.unlink(missing_ok=True)
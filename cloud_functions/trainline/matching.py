@@ -0,0 +1,210 @@
+"""Matching of Trainline bookings to TPX assignments and projects."""
+
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from thefuzz.utils import full_process
+
+
+class AssignmentIndex:
+    """Look up a booker's assignments without scanning every row of the TPX query results.
+
+    Emails are indexed once. A name word is matched against the distinct emails the first time it is seen, and
+    each person's billable assignments are kept sorted by start date so date and week lookups are binary searches.
+    """
+
+    def __init__(self, tpx_df: pd.DataFrame) -> None:
+        """Build the index.
+
+        Args:
+        ----
+            tpx_df (pd.DataFrame): TPX query results with parsed start and end dates
+
+        """
+        self.tpx_df = tpx_df
+        has_email = (tpx_df["email"].notna() & (tpx_df["email"] != "")).to_numpy()
+        emails = tpx_df["email"].to_numpy()
+
+        positions = np.flatnonzero(has_email)
+        unique_emails, first_positions = np.unique(emails[positions], return_index=True)
+        self.first_rows = dict(zip(unique_emails, positions[first_positions], strict=True))
+        self.lowered_emails = {email: str(email).lower() for email in self.first_rows}
+        self.word_emails: dict[str, frozenset[str]] = {}
+
+        project_rows = ~tpx_df["project_id"].duplicated().to_numpy()
+        self.project_rows = dict(zip(tpx_df["project_id"].to_numpy()[project_rows], np.flatnonzero(project_rows), strict=True))
+
+        billable = has_email & ~tpx_df["client_name"].str.contains("TPX", na=False).to_numpy()
+        billable_df = pd.DataFrame(
+            {
+                "email": emails[billable],
+                "start_date": tpx_df["start_date"].to_numpy().astype("datetime64[D]")[billable],
+                "end_date": tpx_df["end_date"].to_numpy().astype("datetime64[D]")[billable],
+                "position": np.flatnonzero(billable),
+            },
+        ).sort_values(["email", "start_date"], kind="stable")
+        self.start_dates = billable_df["start_date"].to_numpy()
+        self.end_dates = billable_df["end_date"].to_numpy()
+        self.positions = billable_df["position"].to_numpy()
+        span_emails, span_starts, span_counts = np.unique(billable_df["email"].to_numpy(), return_index=True, return_counts=True)
+        self.spans = {email: (start, start + count) for email, start, count in zip(span_emails, span_starts, span_counts, strict=True)}
+
+    def match_emails(self, booker_name: str) -> list[str]:
+        """Get the emails containing every word of a booker's name.
+
+        Args:
+        ----
+            booker_name (str): Booker name from the Trainline report
+
+        Returns:
+        -------
+            list[str]: Matching emails, in the order they first appear in the query results
+
+        """
+        emails = set(self.first_rows)
+        for word in booker_name.strip().lower().split():
+            if word not in self.word_emails:
+                self.word_emails[word] = frozenset(email for email, lowered in self.lowered_emails.items() if word in lowered)
+            emails &= self.word_emails[word]
+        return sorted(emails, key=self.first_rows.get)
+
+    def get_person(self, emails: list[str]) -> pd.Series:
+        """Get the first query row of the matched people.
+
+        Args:
+        ----
+            emails (list[str]): Emails returned by `match_emails`
+
+        Returns:
+        -------
+            pd.Series: Query row
+
+        """
+        return self.tpx_df.iloc[self.first_rows[emails[0]]]
+
+    def get_project(self, project_id: int) -> pd.Series:
+        """Get the first query row of a project.
+
+        Args:
+        ----
+            project_id (int): Harvest project ID
+
+        Returns:
+        -------
+            pd.Series: Query row
+
+        """
+        return self.tpx_df.iloc[self.project_rows[project_id]]
+
+    def get_billable_assignments(self, emails: list[str], start_date: np.datetime64, end_date: np.datetime64) -> pd.DataFrame:
+        """Get the billable assignments of the matched people that start and end within a date range.
+
+        Args:
+        ----
+            emails (list[str]): Emails returned by `match_emails`
+            start_date (np.datetime64): First day of the range
+            end_date (np.datetime64): Last day of the range, inclusive
+
+        Returns:
+        -------
+            pd.DataFrame: Query rows, in query order
+
+        """
+        positions = [np.empty(0, dtype=int)]
+        for email in emails:
+            first, last = self.spans.get(email, (0, 0))
+            start_dates = self.start_dates[first:last]
+            first, last = first + np.searchsorted(start_dates, start_date), first + np.searchsorted(start_dates, end_date, side="right")
+            positions.append(self.positions[first:last][self.end_dates[first:last] <= end_date])
+        return self.tpx_df.iloc[np.sort(np.concatenate(positions))]
+
+    def get_billable_projects(self, emails: list[str]) -> list[str]:
+        """Get every project the matched people have a billable assignment on, whatever the date.
+
+        Args:
+        ----
+            emails (list[str]): Emails returned by `match_emails`
+
+        Returns:
+        -------
+            list[str]: Distinct `project_client_name` values
+
+        """
+        spans = [self.positions[slice(*self.spans[email])] for email in emails if email in self.spans]
+        if not spans:
+            return []
+        return self.tpx_df["project_client_name"].iloc[np.concatenate(spans)].unique().tolist()
+
+
+class ProjectMatcher:
+    """Fuzzy match free-text project answers to project names, scoring each answer and project pair once.
+
+    Scores are the same as `thefuzz.process.extractOne` with its default processor and scorer, but pairs are
+    scored in batches with `rapidfuzz.process.cdist` and kept by normalised answer, so repeated answers in a
+    report and across reports are not scored again.
+    """
+
+    def __init__(self, scores: dict[tuple[str, str], float] | None = None) -> None:
+        """Create the matcher.
+
+        Args:
+        ----
+            scores (dict[tuple[str, str], float] | None): Previously computed scores by normalised answer and project
+
+        """
+        self.scores = dict(scores or {})
+        self.new_scores: dict[tuple[str, str], float] = {}
+
+    @staticmethod
+    def normalise(answer: str) -> str:
+        """Normalise an answer the way thefuzz does before scoring.
+
+        Args:
+        ----
+            answer (str): Free-text answer, missing answers are treated as empty
+
+        Returns:
+        -------
+            str: Lower case ASCII letters and digits, anything else replaced by spaces
+
+        """
+        return full_process(answer, force_ascii=True) if isinstance(answer, str) else ""
+
+    def score(self, pairs: Iterable[tuple[str, str]]) -> None:
+        """Score every answer and project pair that has not been scored yet, in one pass.
+
+        Args:
+        ----
+            pairs (Iterable[tuple[str, str]]): Answers and the projects they may refer to
+
+        """
+        missing = {(self.normalise(answer), project) for answer, project in pairs} - self.scores.keys()
+        if not missing:
+            return
+        answers = sorted({answer for answer, _ in missing})
+        projects = sorted({project for _, project in missing})
+        matrix = process.cdist(answers, [self.normalise(project) for project in projects], scorer=fuzz.WRatio, workers=-1)
+        rows = {answer: i for i, answer in enumerate(answers)}
+        columns = {project: i for i, project in enumerate(projects)}
+        self.new_scores.update({(answer, project): float(matrix[rows[answer], columns[project]]) for answer, project in missing})
+        self.scores.update(self.new_scores)
+
+    def match(self, answer: str, projects: list[str]) -> tuple[str, int]:
+        """Get the project closest to an answer.
+
+        Args:
+        ----
+            answer (str): Free-text answer
+            projects (list[str]): Candidate projects
+
+        Returns:
+        -------
+            tuple[str, int]: First of the best scoring projects and its rounded score
+
+        """
+        self.score((answer, project) for project in projects)
+        scores = [self.scores[self.normalise(answer), project] for project in projects]
+        best = int(np.argmax(scores))
+        return projects[best], round(scores[best])
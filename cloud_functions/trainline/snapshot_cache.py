@@ -0,0 +1,157 @@
+"""Parquet snapshots of BigQuery query results, reused while their source tables are unchanged."""
+
+import hashlib
+import io
+from functools import cache
+from os import getenv
+from pathlib import Path
+from urllib.parse import quote
+
+import google.auth
+import pandas as pd
+from data_pipeline_tools.util import read_from_bigquery
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery
+
+# gs://bucket/prefix, or a local directory when testing. Snapshots are skipped when unset.
+SNAPSHOT_LOCATION = getenv("SNAPSHOT_LOCATION")
+STORAGE_URL = "https://storage.googleapis.com"
+
+
+def get_snapshot_name(client: bigquery.Client, query: str) -> str:
+    """Get the snapshot name of a query, which changes whenever the query or one of its source tables does.
+
+    The source tables come from a dry run, which is free and uses no slots.
+
+    Args:
+    ----
+        client (bigquery.Client): BigQuery client
+        query (str): Query
+
+    Returns:
+    -------
+        str: Snapshot file name
+
+    """
+    dry_run = client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+    versions = sorted(
+        f"{table.project}.{table.dataset_id}.{table.table_id}@{client.get_table(table).modified.isoformat()}"
+        for table in dry_run.referenced_tables
+    )
+    digest = hashlib.sha256("\n".join([query, *versions]).encode()).hexdigest()
+    return f"{digest}.parquet"
+
+
+@cache
+def get_storage_session() -> AuthorizedSession:
+    """Get a session authorised to read and write Cloud Storage objects.
+
+    Returns
+    -------
+        AuthorizedSession: Session with the default credentials
+
+    """
+    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/devstorage.read_write"])
+    return AuthorizedSession(credentials)
+
+
+def split_location(location: str, name: str) -> tuple[str, str]:
+    """Split a gs:// location and file name into a bucket and object name.
+
+    Args:
+    ----
+        location (str): gs://bucket/prefix
+        name (str): File name
+
+    Returns:
+    -------
+        tuple[str, str]: Bucket and object name
+
+    """
+    bucket, _, prefix = location.removeprefix("gs://").partition("/")
+    return bucket, f"{prefix.strip('/')}/{name}".lstrip("/")
+
+
+def read_blob(location: str, name: str) -> bytes | None:
+    """Read a file from the snapshot store.
+
+    Args:
+    ----
+        location (str): gs://bucket/prefix or a local directory
+        name (str): File name
+
+    Returns:
+    -------
+        bytes | None: File contents, None if there is no such file
+
+    """
+    if not location.startswith("gs://"):
+        path = Path(location) / name
+        return path.read_bytes() if path.exists() else None
+    bucket, object_name = split_location(location, name)
+    response = get_storage_session().get(f"{STORAGE_URL}/storage/v1/b/{bucket}/o/{quote(object_name, safe='')}", params={"alt": "media"})
+    if response.status_code == 404:  # noqa: PLR2004
+        return None
+    response.raise_for_status()
+    return response.content
+
+
+def write_blob(location: str, name: str, data: bytes) -> None:
+    """Write a file to the snapshot store.
+
+    Args:
+    ----
+        location (str): gs://bucket/prefix or a local directory
+        name (str): File name
+        data (bytes): File contents
+
+    """
+    if not location.startswith("gs://"):
+        path = Path(location) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return
+    bucket, object_name = split_location(location, name)
+    get_storage_session().post(
+        f"{STORAGE_URL}/upload/storage/v1/b/{bucket}/o",
+        params={"uploadType": "media", "name": object_name},
+        data=data,
+        headers={"Content-Type": "application/octet-stream"},
+    ).raise_for_status()
+
+
+def read_from_bigquery_cached(project_id: str, query: str) -> pd.DataFrame:
+    """Read query results from the latest snapshot, querying BigQuery only when the query or its source tables changed.
+
+    Any failure to check or save a snapshot falls back to querying BigQuery.
+
+    Args:
+    ----
+        project_id (str): GCP project ID
+        query (str): Query
+
+    Returns:
+    -------
+        pd.DataFrame: Query results
+
+    """
+    if not SNAPSHOT_LOCATION:
+        return read_from_bigquery(project_id, query)
+    try:
+        name = get_snapshot_name(bigquery.Client(project=project_id), query)
+        snapshot = read_blob(SNAPSHOT_LOCATION, name)
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to check query snapshot: {e}")
+        return read_from_bigquery(project_id, query)
+    if snapshot is not None:
+        print(f"Using query snapshot {name}")
+        return pd.read_parquet(io.BytesIO(snapshot))
+
+    df = read_from_bigquery(project_id, query)
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, compression="zstd", index=False)
+    try:
+        write_blob(SNAPSHOT_LOCATION, name, buffer.getvalue())
+    except Exception as e:  # noqa: BLE001
+        print(f"Unable to save query snapshot: {e}")
+    return df
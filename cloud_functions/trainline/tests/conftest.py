@@ -0,0 +1,6 @@
+"""Test setup for the Trainline function."""
+
+import data_pipeline_tools.auth
+
+# main reads the Slack webhook from Secret Manager when it is imported.
+data_pipeline_tools.auth.access_secret_version = lambda *_: "https://hooks.slack.invalid"
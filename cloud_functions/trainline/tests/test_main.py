@@ -0,0 +1,120 @@
+"""Tests for posting Trainline expenses and recording them in the ledger."""
+
+import main
+import pandas as pd
+import pytest
+from google.api_core.exceptions import Forbidden, NotFound
+
+CONFIG = {"gcp_project": "test-project", "dataset_id": "trainline", "table_name": "results"}
+LEDGER_TABLE = "test-project.trainline.results_ledger"
+
+
+class FakeBigQuery:
+    """BigQuery client that records streaming inserts and fails on anything that would run a load job."""
+
+    def __init__(self, insert_errors: list | None = None, *, table_exists: bool = True) -> None:
+        self.insert_errors = insert_errors or []
+        self.table_exists = table_exists
+        self.created: list[str] = []
+        self.inserted: list[tuple[str, list[dict], list[str]]] = []
+
+    def create_table(self, table: main.bigquery.Table, *, exists_ok: bool = False) -> None:
+        assert exists_ok
+        self.created.append(f"{table.project}.{table.dataset_id}.{table.table_id}")
+
+    def get_table(self, table_id: str) -> None:
+        if not self.table_exists:
+            raise NotFound(table_id)
+
+    def insert_rows_json(self, table_id: str, rows: list[dict], row_ids: list[str]) -> list:
+        self.inserted.append((table_id, rows, row_ids))
+        return self.insert_errors
+
+    def load_table_from_dataframe(self, *args: object, **kwargs: object) -> None:
+        pytest.fail("the ledger must not be written with load jobs")
+
+    load_table_from_json = load_table_from_dataframe
+
+
+@pytest.fixture
+def bigquery_client(monkeypatch: pytest.MonkeyPatch) -> FakeBigQuery:
+    client = FakeBigQuery()
+    monkeypatch.setattr(main.bigquery, "Client", lambda project: client)
+    monkeypatch.setattr(main, "write_to_bigquery", lambda *args: pytest.fail("the ledger must not be written with load jobs"))
+    return client
+
+
+@pytest.fixture
+def harvest(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    posted = []
+
+    def post_expense(client: object, config: dict, expense: dict) -> dict:
+        if expense["booking"] == "rejected":
+            message = "422 Unprocessable Entity"
+            raise ValueError(message)
+        posted.append(expense["booking"])
+        return {"id": len(posted)}
+
+    monkeypatch.setattr(main, "post_expense", post_expense)
+    return posted
+
+
+def pending(booking: str, user_id: int = 1) -> tuple[dict, dict]:
+    result = {"First Name": "Ada", "Last Name": "Lovelace", "Client": "TPX", "Project": "Travel"}
+    expense = {"booking": booking, "user_id": user_id, "project_id": 2, "total_cost": 12.5, "billable": True}
+    return result, expense
+
+
+def test_each_posted_expense_is_streamed_to_the_ledger(bigquery_client: FakeBigQuery, harvest: list[str]) -> None:
+    expenses = [pending("a"), pending("b"), pending("c"), pending("posted"), pending("rejected")]
+    ledger = {main.get_ledger_key("posted", 1, 12.5)}
+
+    main.post_expenses(None, CONFIG, expenses, ledger)
+
+    assert bigquery_client.created == [LEDGER_TABLE]
+    assert sorted(harvest) == ["a", "b", "c"]
+    assert len(bigquery_client.inserted) == len(harvest)
+    assert all(table_id == LEDGER_TABLE and len(rows) == 1 for table_id, rows, _ in bigquery_client.inserted)
+    assert sorted(rows[0]["booking"] for _, rows, _ in bigquery_client.inserted) == ["a", "b", "c"]
+    assert len({row_ids[0] for _, _, row_ids in bigquery_client.inserted}) == len(harvest)
+    assert expenses[3][0]["Notes"] == "already posted"
+    assert expenses[4][0]["Notes"] == "422 Unprocessable Entity"
+
+
+def test_ledger_failure_stops_posting(monkeypatch: pytest.MonkeyPatch, bigquery_client: FakeBigQuery, harvest: list[str]) -> None:
+    bigquery_client.insert_errors = [{"index": 0, "errors": [{"reason": "invalid"}]}]
+    notifications = []
+    monkeypatch.setattr(main, "send_slack_notification", notifications.append)
+    monkeypatch.setattr(main, "MAX_WORKERS", 1)
+    expenses = [pending(booking) for booking in "abc"]
+
+    with pytest.raises(main.LedgerError):
+        main.post_expenses(None, CONFIG, expenses, set())
+
+    assert harvest == ["a"]
+    assert [result.get("Notes") for result, _ in expenses[1:]] == ["not posted, unable to write expense ledger"] * 2
+    assert "expenses 1 are posted but not recorded" in notifications[0]
+
+
+def test_missing_ledger_table_is_empty(bigquery_client: FakeBigQuery) -> None:
+    bigquery_client.table_exists = False
+
+    assert main.load_ledger(CONFIG) == set()
+
+
+def test_ledger_read_errors_are_raised(monkeypatch: pytest.MonkeyPatch, bigquery_client: FakeBigQuery) -> None:
+    def read_from_bigquery(project_id: str, query: str) -> pd.DataFrame:
+        raise Forbidden(query)
+
+    monkeypatch.setattr(main, "read_from_bigquery", read_from_bigquery)
+
+    with pytest.raises(Forbidden):
+        main.load_ledger(CONFIG)
+
+
+def test_ledger_keys_are_loaded(monkeypatch: pytest.MonkeyPatch, bigquery_client: FakeBigQuery) -> None:
+    spent_date = main.PROCESSING_DATE.strftime("%Y-%m-%d")
+    ledger_df = pd.DataFrame([{"booking": "a", "user_id": 1, "amount": "12.5", "spent_date": spent_date}])
+    monkeypatch.setattr(main, "read_from_bigquery", lambda project_id, query: ledger_df)
+
+    assert main.load_ledger(CONFIG) == {main.get_ledger_key("a", 1, 12.5)}
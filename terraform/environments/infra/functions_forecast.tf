@@ -4,7 +4,7 @@ data "archive_file" "forecast_assignments" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/forecast/assignments"
   output_path = "${path.root}/build/forecast_assignments.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket
@@ -49,7 +49,7 @@ data "archive_file" "forecast_assignments_filled" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/forecast/assignments_filled"
   output_path = "${path.root}/build/forecast_assignments_filled.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket
@@ -5,7 +5,7 @@ data "archive_file" "harvest_timesheet" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/harvest/timesheets"
   output_path = "${path.root}/build/harvest_timesheet.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket
@@ -4,7 +4,7 @@ data "archive_file" "hibob_time_off" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/hibob/time_off"
   output_path = "${path.root}/build/hibob_time_off.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket
@@ -85,7 +85,7 @@ data "archive_file" "hibob_time_off_policies" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/hibob/time_off_policies"
   output_path = "${path.root}/build/hibob_time_off_policies.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 resource "google_storage_bucket_object" "hibob_time_off_policies" {
@@ -122,7 +122,7 @@ data "archive_file" "hibob_holiday_balances" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/hibob/holiday_balances"
   output_path = "${path.root}/build/hibob_holiday_balances.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 resource "google_storage_bucket_object" "hibob_holiday_balances" {
@@ -4,7 +4,7 @@ data "archive_file" "pipedrive_deals" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/pipedrive/deals"
   output_path = "${path.root}/build/pipedrive_deals.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket
@@ -48,7 +48,7 @@ data "archive_file" "pipedrive_organisations" {
   type        = "zip"
   source_dir  = "../../../cloud_functions/pipedrive/organisations"
   output_path = "${path.root}/build/pipedrive_organisations.zip"
-  excludes    = [".venv"]
+  excludes    = [".venv", "tests"]
 }
 
 # Add source code zip to the Cloud Function's bucket